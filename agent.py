@@ -2,68 +2,104 @@
 # -------------------------------------------------------------------------
 
 # Custom libraries
+import encoders
+import log
 import state_action_reward as sar
+from buffers import EpisodeBuffer, ReplayBuffer
+from policy import Policy
+from qtable import SharedTables, save_model, load_model, save_sparse_model, load_sparse_model, convert_csv_model
+from streams import RandomStream
 
 # Public libraries
-import pandas as pd
 import numpy as np
-import random
+import os
 
 
-# 2. Q-Learning
+MODEL_DIR = "../assets/files/"
+
+
+# 2. Table agent
 # -------------------------------------------------------------------------
 
-class QLearningAgent(object):
+class TableAgent(object):
+    """
+    Q-table and visits table handling shared by the tabular agents: creation, shared memory, persistence
+    and freezing. Subclasses set space, actions, encoder and new_model before calling init_tables.
+    """
 
-    def agent_init(self, agent_init_info):
+    def init_tables(self, agent_init_info, default_path):
         """
-        Initializes the agent to get parameters and import/create q-tables.
-        Required parameters: agent_init_info as dict
+        Attaches to, creates or imports the Q-table and visits table.
+        Required parameters:
+            - agent_init_info as dict
+            - default_path as str, model path prefix if agent_init_info has no model_path
         """
 
-        # (1) Store the parameters provided in agent_init_info
-        self.states = sar.states()
-        self.actions = sar.actions()
-        self.prev_state = 0
-        self.prev_action = 0
-
-        self.epsilon = agent_init_info["epsilon"]
-        self.step_size = agent_init_info["step_size"]
-        self.new_model = agent_init_info["new_model"]
-        self.R = sar.rewards(self.states, self.actions)
+        # (1) Attach to the Q-table and visits table another process holds in shared memory (Hogwild)
+        self.shared = None
+        if agent_init_info.get("shared_name"):
+            encoders.require_dense(agent_init_info, "Attaching to shared memory tables")
+            self.shared = SharedTables(self.space, self.actions, name=agent_init_info["shared_name"],
+                                       locks=agent_init_info.get("shared_locks"))
+            self.q, self.visit = self.shared.q, self.shared.visit
 
         # (2) Create Q-table that stores action-value estimates, initialized at zero
-        if self.new_model == True:
-            self.q = pd.DataFrame(data=np.zeros((len(self.states), len(self.actions))),
-                                  columns=self.actions,
-                                  index=self.states)
-
+        elif self.new_model == True:
+            self.q = self.encoder.table(self.actions)
             self.visit = self.q.copy()
 
-
         # (3) Import already existing Q-values and visits table if possible
         else:
+            path = agent_init_info.get("model_path", default_path)
             try:
-                self.q = pd.read_csv("../assets/files/q-learning-q.csv", sep=";", index_col="Unnamed: 0")
-                self.q.index = self.q.index.map(lambda x: eval(x))
-                self.q["IDX"] = self.q.index
-                self.q = self.q.set_index("IDX", drop=True)
-                self.q.index.name = None
-
-                self.visit = pd.read_csv("../assets/files/q-learning-visits.csv", sep=";", index_col="Unnamed: 0")
-                self.visit.index = self.visit.index.map(lambda x: eval(x))
-                self.visit["IDX"] = self.visit.index
-                self.visit = self.visit.set_index("IDX", drop=True)
-                self.visit.index.name = None
-
-            # (3a) Create empty q-tables if file is not found
-            except:
-                print("Existing model could not be found. New model is being created.")
-                self.q = pd.DataFrame(data=np.zeros((len(self.states), len(self.actions))),
-                                      columns=self.actions,
-                                      index=self.states)
-
-                self.visit = self.q.copy()
+                self.load(path, mmap_mode=agent_init_info.get("mmap_mode"))
+
+            except FileNotFoundError:
+                # (3a) Convert a CSV model of earlier versions to the binary format once
+                if not self.encoder.sparse and os.path.exists(path + "-q.csv"):
+                    print(f'Converting the CSV model {path} to the binary format.')
+                    convert_csv_model(path, self.space, self.actions)
+                    self.load(path, mmap_mode=agent_init_info.get("mmap_mode"))
+
+                # (3b) Create empty q-tables if file is not found, unless the model was asked for explicitly
+                elif "model_path" in agent_init_info:
+                    raise
+                else:
+                    print("Existing model could not be found. New model is being created.")
+                    self.q = self.encoder.table(self.actions)
+                    self.visit = self.q.copy()
+
+    def save(self, path):
+        """
+        Stores the Q-table and visits table in binary format.
+        Required parameters: path as str, file prefix without extension
+        """
+
+        if self.encoder.sparse:
+            save_sparse_model(path, self.q, self.visit, self.encoder.layout())
+        else:
+            save_model(path, self.q, self.visit)
+
+    def load(self, path, mmap_mode=None):
+        """
+        Loads the Q-table and visits table stored by save(), optionally memory-mapped.
+        Required parameters: path as str, file prefix without extension
+        """
+
+        if self.encoder.sparse:
+            self.q, self.visit = load_sparse_model(path, self.encoder.layout(), self.actions)
+        else:
+            self.q, self.visit = load_model(path, self.space, self.actions, mmap_mode=mmap_mode)
+
+    def freeze(self, seed=None):
+        """
+        Compiles the current Q-table into a greedy Policy for serving (no exploration, no learning).
+        Optional parameters: seed for the tie-breaking random generator
+        """
+
+        if self.encoder.sparse:
+            raise ValueError("A Policy is compiled from dense state indices, freeze needs the dense encoder")
+        return Policy.compile(self.q.values, seed)
 
     def step(self, state_dict, actions_dict):
         """
@@ -73,73 +109,156 @@ class QLearningAgent(object):
             - actions_dict as dict
         """
 
-        # (1) Transform state dictionary into tuple
-        state = [i for i in state_dict.values()]
-        state = tuple(state)
+        allowed = [j for j, val in enumerate(actions_dict.values()) if val != 0]
+        return self.actions[self.act(self.encoder.from_dict(state_dict), allowed)]
+
+    def update(self, state_dict, action):
+        """
+        Updating Q-values according to Belman equation
+        Required parameters:
+            - state_dict as dict
+            - action as str
+        """
 
-        # (2) Choose action using epsilon greedy
-        # (2a) Random action
-        if random.random() < self.epsilon:
+        self.learn(self.encoder.from_dict(state_dict), self.q.action_idx(action))
 
-            actions_possible = [key for key, val in actions_dict.items() if val != 0]
-            action = random.choice(actions_possible)
 
-        # (2b) Greedy action
-        else:
-            actions_possible = [key for key, val in actions_dict.items() if val != 0]
-            random.shuffle(actions_possible)
-            val_max = 0
+# 3. Q-Learning
+# -------------------------------------------------------------------------
 
-            for i in actions_possible:
-                val = self.q.loc[[state], i][0]
-                if val >= val_max:
-                    val_max = val
-                    action = i
+class QLearningAgent(TableAgent):
 
-        return action
+    # Learns after every move (not only at the end of the episode)
+    episodic = False
 
-    def update(self, state_dict, action):
+    def agent_init(self, agent_init_info):
         """
-        Updating Q-values according to Belman equation
+        Initializes the agent to get parameters and import/create q-tables.
+        Required parameters: agent_init_info as dict
+        """
+
+        # (1) Store the parameters provided in agent_init_info
+        self.space = sar.state_space()
+        self.states = self.space.states
+        self.actions = sar.actions()
+        self.prev_state = None
+        self.prev_action = None
+
+        self.epsilon = agent_init_info["epsilon"]
+        self.step_size = agent_init_info["step_size"]
+        self.new_model = agent_init_info["new_model"]
+        self.rng = RandomStream(agent_init_info.get("seed"))
+        self.encoder = encoders.encoder(agent_init_info.get("encoder", "dense"))
+        self.R = self.encoder.rewards(self.actions)
+
+        # (1a) Optional experience replay: every replay_every transitions a minibatch of replay_batch is replayed
+        self.replay = None
+        if agent_init_info.get("replay_capacity"):
+            self.replay = ReplayBuffer(agent_init_info["replay_capacity"])
+            self.replay_batch = agent_init_info.get("replay_batch", 32)
+            self.replay_every = agent_init_info.get("replay_every", 1)
+            self.replay_count = 0
+
+        # (2) Attach to, create or import the Q-table and visits table
+        self.init_tables(agent_init_info, MODEL_DIR + "q-learning")
+
+    def act(self, s, allowed, row=None):
+        """
+        Choose the next action index by epsilon greedy.
         Required parameters:
-            - state_dict as dict
-            - action as str
+            - s as int, state of the agent's encoder (dense state index by default)
+            - allowed as list of available action indices
+        Optional parameters: row as list, Q-values of s fetched beforehand
+        """
+
+        # (1) Random action
+        if self.rng.random() < self.epsilon:
+            return self.rng.choice(allowed)
+
+        # (2) Greedy action
+        return self.q.argmax(s, allowed, self.rng, row)
+
+    def learn(self, s, a):
+        """
+        Index version of update: TD backup of the previous state-action pair towards (s, a).
+        Required parameters:
+            - s as int, state of the agent's encoder (dense state index by default)
+            - a as int, action index
         """
-        state = [i for i in state_dict.values()]
-        state = tuple(state)
 
         # (1) Set prev_state unless first turn
-        if self.prev_state != 0:
-            prev_q = self.q.loc[[self.prev_state], self.prev_action][0]
-            this_q = self.q.loc[[state], action][0]
-            reward = self.R.loc[[state], action][0]
-
-            print("\n")
-            print(f'prev_q: {prev_q}')
-            print(f'this_q: {this_q}')
-            print(f'prev_state: {self.prev_state}')
-            print(f'this_state: {state}')
-            print(f'prev_action: {self.prev_action}')
-            print(f'this_action: {action}')
-            print(f'reward: {reward}')
+        if self.prev_state is not None:
+            prev_s, prev_a = self.prev_state, self.prev_action
+
+            prev_q = self.q.get(prev_s, prev_a)
+            this_q = self.q.get(s, a)
+            reward = self.R.get(s, a)
+
+            if log.active >= log.DEBUG:
+                log.emit(log.DEBUG, "update", "\n".join(["\n",
+                                                         f'prev_q: {prev_q}',
+                                                         f'this_q: {this_q}',
+                                                         f'prev_state: {self.encoder.label(prev_s)}',
+                                                         f'this_state: {self.encoder.label(s)}',
+                                                         f'prev_action: {self.actions[prev_a]}',
+                                                         f'this_action: {self.actions[a]}',
+                                                         f'reward: {reward}']),
+                         prev_q=prev_q, this_q=this_q, prev_state=self.encoder.label(prev_s), this_state=self.encoder.label(s),
+                         prev_action=self.actions[prev_a], this_action=self.actions[a], reward=reward)
 
             # Calculate new Q-values
             if reward == 0:
-                self.q.loc[[self.prev_state], self.prev_action] = prev_q + self.step_size * (reward + this_q - prev_q)
+                self.q.set(prev_s, prev_a, prev_q + self.step_size * (reward + this_q - prev_q))
             else:
-                self.q.loc[[self.prev_state], self.prev_action] = prev_q + self.step_size * (reward - prev_q)
+                self.q.set(prev_s, prev_a, prev_q + self.step_size * (reward - prev_q))
+
+            self.visit.add(prev_s, prev_a, 1)
 
-            self.visit.loc[[self.prev_state], self.prev_action] += 1
+            if self.replay is not None:
+                self.remember(prev_s, prev_a, reward, s, a)
 
         # (2) Save and return action/state
-        self.prev_state = state
-        self.prev_action = action
+        self.prev_state = s
+        self.prev_action = a
+
+    def remember(self, prev_s, prev_a, reward, s, a):
+        """
+        Stores a transition in the replay buffer and replays a minibatch every replay_every transitions.
+        """
+
+        self.replay.push(prev_s, prev_a, reward, s, a, reward != 0)
+        self.replay_count += 1
+
+        if self.replay_count % self.replay_every == 0 and len(self.replay) >= self.replay_batch:
+            self.replay_update(self.replay_batch)
+
+    def replay_update(self, batch_size):
+        """
+        Batched TD backup of a minibatch sampled from the replay buffer.
+        """
+
+        # Drawn from the agent's stream, which Game replaces per game, so seeded runs stay reproducible
+        self.batch_update(*self.replay.sample(batch_size, self.rng.generator))
+
+    def batch_update(self, states, actions, rewards, next_states, next_actions, terminal):
+        """
+        Batched TD backup of transitions given as arrays, with the same targets as learn():
+        reward + Q(next) for non-terminal transitions and the reward alone otherwise.
+        All transitions are moved from the values before the batch; a pair occurring k times gets the mean
+        of its k updates (QTable.add_mean). Visits are not counted.
+        """
 
+        target = rewards + np.where(terminal, 0.0, self.q.lookup(next_states, next_actions))
+        self.q.add_mean(states, actions, self.step_size * (target - self.q.lookup(states, actions)))
 
-# 3. Monte Carlo
+
+# 4. Monte Carlo
 # -------------------------------------------------------------------------
 
-class MonteCarloAgent(object):
+class MonteCarloAgent(TableAgent):
+
+    # Learns once per episode, from the terminal state
+    episodic = True
 
     def agent_init(self, agent_init_info):
         """
@@ -148,106 +267,85 @@ class MonteCarloAgent(object):
         """
 
         # (1) Store the parameters provided in agent_init_info
-        self.states = sar.states()
+        self.space = sar.state_space()
+        self.states = self.space.states
         self.actions = sar.actions()
-        self.state_seen = list()
-        self.action_seen = list()
-        self.q_seen = list()
+        self.episode = EpisodeBuffer()
 
         self.epsilon = agent_init_info["epsilon"]
         self.step_size = agent_init_info["step_size"]
         self.new_model = agent_init_info["new_model"]
-        self.R = sar.rewards(self.states, self.actions)
+        self.rng = RandomStream(agent_init_info.get("seed"))
+        self.gamma = agent_init_info.get("gamma", 1.0)
+        self.first_visit = agent_init_info.get("first_visit", True)
+        self.encoder = encoders.encoder(agent_init_info.get("encoder", "dense"))
+        self.R = self.encoder.rewards(self.actions)
 
-        # (2) Create Q-table that stores action-value estimates, initialized at zero
-        if self.new_model == True:
-            self.q = pd.DataFrame(data=np.zeros((len(self.states), len(self.actions))),
-                                  columns=self.actions,
-                                  index=self.states)
+        # (2) Attach to, create or import the Q-table and visits table
+        self.init_tables(agent_init_info, MODEL_DIR + "monte-carlo")
 
-            self.visit = self.q.copy()
+    def act(self, s, allowed, row=None):
+        """
+        Choose the next action index by epsilon greedy and record the state-action pair in the episode.
+        Required parameters:
+            - s as int, state of the agent's encoder (dense state index by default)
+            - allowed as list of available action indices
+        Optional parameters: row as list, Q-values of s fetched beforehand
+        """
 
-        # (3) Import already existing Q-values and visits table if possible
+        # (1) Choose action using epsilon greedy
+        # (1a) Random action
+        if self.rng.random() < self.epsilon:
+            a = self.rng.choice(allowed)
+
+        # (1b) Greedy action
         else:
-            try:
-                self.q = pd.read_csv("../assets/files/monte-carlo-q.csv", sep=";", index_col="Unnamed: 0")
-                self.q.index = self.q.index.map(lambda x: eval(x))
-                self.q["IDX"] = self.q.index
-                self.q = self.q.set_index("IDX", drop=True)
-                self.q.index.name = None
-
-                self.visit = pd.read_csv("../assets/files/monte-carlo-visits.csv", sep=";", index_col="Unnamed: 0")
-                self.visit.index = self.visit.index.map(lambda x: eval(x))
-                self.visit["IDX"] = self.visit.index
-                self.visit = self.visit.set_index("IDX", drop=True)
-                self.visit.index.name = None
-
-            # (3a) Create empty q-tables if file is not found
-            except:
-                print("Existing model could not be found. New model is being created.")
-                self.q = pd.DataFrame(data=np.zeros((len(self.states), len(self.actions))),
-                                      columns=self.actions,
-                                      index=self.states)
-
-                self.visit = self.q.copy()
+            a = self.q.argmax(s, allowed, self.rng, row)
 
-    def step(self, state_dict, actions_dict):
+        # (2) Record state-action pair, visits are counted at the end of the episode
+        self.episode.add(s, a)
+
+        return a
+
+    def learn(self, s, a):
         """
-        Choose the optimal next action according to the followed policy.
+        Index version of update: ends the episode with the reward of (s, a) and moves the recorded pairs
+        towards their discounted return in one vectorized step (first-visit or every-visit).
+        With every-visit, repeated pairs are all moved from their value before the update.
         Required parameters:
-            - state_dict as dict
-            - actions_dict as dict
+            - s as int, state of the agent's encoder (dense state index by default)
+            - a as int, action index
         """
 
-        # (1) Transform state dictionary into tuple
-        state = [i for i in state_dict.values()]
-        state = tuple(state)
-        # (2) Choose action using epsilon greedy
-        # (2a) Random action
-        if random.random() < self.epsilon:
-
-            actions_possible = [key for key, val in actions_dict.items() if val != 0]
-            action = random.choice(actions_possible)
-
-        # (2b) Greedy action
-        else:
-            actions_possible = [key for key, val in actions_dict.items() if val != 0]
-            random.shuffle(actions_possible)
-            val_max = 0
+        reward = self.R.get(s, a)
+        states, actions, returns = self.episode.returns(reward, self.gamma, self.first_visit)
 
-            for i in actions_possible:
-                print(self.q)
-                print(state)
-                val = self.q.loc[[state], i][0]
-                if val >= val_max:
-                    val_max = val
-                    action = i
+        # Update Q-values of all state-action pairs visited in the episode
+        self.q.add_at(states, actions, self.step_size * (returns - self.q.lookup(states, actions)))
 
-        # (3) Add state-action pair if not seen in this simulation
-        if ((state), action) not in self.q_seen:
-            self.state_seen.append(state)
-            self.action_seen.append(action)
+        n = len(self.episode)
+        self.visit.add_at(self.episode.states[:n], self.episode.actions[:n], 1)
 
-        self.q_seen.append(((state), action))
-        self.visit.loc[[state], action] += 1
+        if log.active >= log.DEBUG:
+            log.emit(log.DEBUG, "update", f'Monte Carlo update of {len(states)} pairs with reward {reward}',
+                     pairs=len(states), steps=n, reward=reward)
 
-        return action
+        self.episode.clear()
 
-    def update(self, state_dict, action):
+    def batch_update(self, states, actions, returns, episodes=None):
         """
-        Updating Q-values according to Belman equation
-        Required parameters:
-            - state_dict as dict
-            - action as str
+        Moves the state-action pairs of many episodes towards their returns in one vectorized step,
+        from the values before the batch. With episode ids, the updates of a pair within one episode
+        are summed as in learn(); a pair updated by k episodes gets the mean of their k updates
+        (QTable.add_mean). Visits are not counted.
         """
 
-        state = [i for i in state_dict.values()]
-        state = tuple(state)
-        reward = self.R.loc[[state], action][0]
+        delta = self.step_size * (returns - self.q.lookup(states, actions))
 
-        # Update Q-values of all state-action pairs visited in the simulation
-        for s, a in zip(self.state_seen, self.action_seen):
-            self.q.loc[[s], a] += self.step_size * (reward - self.q.loc[[s], a])
-            print(self.q.loc[[s], a])
+        if episodes is not None:
+            key = (np.asarray(episodes) * len(self.space) + states) * len(self.actions) + actions
+            _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+            delta = np.bincount(inverse, weights=delta)
+            states, actions = states[first], actions[first]
 
-        self.state_seen, self.action_seen, self.q_seen = list(), list(), list()
+        self.q.add_mean(states, actions, delta)
@@ -1,41 +1,38 @@
 # Public libraries
 import numpy as np
-import random
 import time
-from tqdm.notebook import tqdm
-import sys, os
+from time import perf_counter
+import multiprocessing
+import os
 
 # Custom libraries
 import agent as ag
+import checkpoint
+import encoders
+import instrument
+import log
+import results
 import state_action_reward as sar
-
-
-def block_print():
-    sys.__stdout__ = sys.stdout
-    sys.stdout = open(os.devnull, "w")
-
-
-def enable_print():
-    sys.stdout = sys.__stdout__
-
-
-def bold(string):
-    chr_start = "\033[1m"
-    chr_end = "\033[0m"
-    print(chr_start + string + chr_end)
-
-
-def underline(string):
-    chr_start = "\033[4m"
-    chr_end = "\033[0m"
-    print(chr_start + string + chr_end)
+import streams
+import traces
+from qtable import SharedTables, merge_tables
 
 
 # Card class
 class Card(object):
+    """
+    A card is identified by its color and value, and encoded as code = suit * 8 + value - 1
+    with the bit 1 << code in hand masks. The open card placeholder 'INIT' has suit -1 and no bit.
+    """
+
+    __slots__ = ("color", "value", "suit", "code", "bit")
+
     def __init__(self, c, v):
         self.color = c
         self.value = v
+        self.suit = SUIT_RANK.get(c, -1)
+        self.code = self.suit * 8 + v - 1 if self.suit >= 0 else -1
+        self.bit = 1 << self.code if self.suit >= 0 else 0
 
     def evaluate_card(self, open_c):
         if (self.color == open_c):
@@ -47,22 +44,38 @@ class Card(object):
     def show_card(self):
         print (self.color, self.value)
 
+
+SUIT_RANK = {suit: i for i, suit in enumerate(sar.SUITS)}
+
+# The 32 cards exist once and are shared by all decks and hands
+CARDS = [Card(c, v) for c in sar.SUITS for v in range(1, 9)]
+
+# Placeholder of the open card at the start of every sub-round
+INIT = Card('INIT', 0)
+
 # Deck class
 class Deck(object):
-    def __init__(self):
+    def __init__(self, rng):
+        self.rng = rng
         self.cards = list()
         self.build()
-        self.shuffle()
+        if rng is not None:
+            self.shuffle()
 
     def build(self):
-        colors = ["PIR", "ZOL", "TOK", "MAK"]
-        cards_32 = [Card(c, v) for c in colors for v in range(1, 9)]
+        self.cards.extend(CARDS)
 
-        for card in cards_32:
-            self.cards.append(card)
+    def reset(self, rng):
+        """
+        Refills and shuffles the deck in place for a new round.
+        """
+
+        self.rng = rng
+        self.cards[:] = CARDS
+        self.shuffle()
 
     def shuffle(self):
-        random.shuffle(self.cards)
+        self.cards[:] = [self.cards[i] for i in self.rng.permutation(len(self.cards))]
 
     def draw_from_deck(self):
         return self.cards.pop()
@@ -71,20 +84,41 @@ class Player(object):
     """
     Player consists of a list of cards representing a players hand cards.
     Player can have a name, hand, playable hand. Thereform the players' state can be determined.
+    Hand and playable hand are mirrored as card bit masks, so suit counts are popcounts of single bytes.
+    The playable hand is kept as list of hand indices (play_index), cards leave the hand by index.
+    Random moves draw from the game's random stream rng; a seat with an agent plays the agent's moves.
     """
 
-    def __init__(self, name):
+    def __init__(self, name, rng, agent=None, trace=None):
         self.name = name
         self.hand = list()
-        self.hand_play = list()
-        self.card_play = 0
-        self.points = 0
+        self.play_index = list()
         self.state = dict()
         self.actions = dict()
-        self.action = 0
         self.disced_deck = list()
         self.order = 0
-        agent.prev_state = 0
+        self.reset(rng, agent, trace)
+
+    def reset(self, rng, agent=None, trace=None):
+        """
+        Resets the player in place for a new game.
+        """
+
+        self.rng = rng
+        self.agent = agent
+        self.trace = trace
+        self.planned = None
+        self.hand.clear()
+        self.play_index.clear()
+        self.disced_deck.clear()
+        self.mask = 0
+        self.play_mask = 0
+        self.move_key = 0
+        self.card_play = 0
+        self.points = 0
+        self.action = 0
+        if agent is not None:
+            agent.prev_state = None
 
     def clear_disc(self):
         self.disced_deck.clear()
@@ -101,67 +135,69 @@ class Player(object):
 
     def evaluate_hand(self, card_open):
 
-        self.hand_play.clear()
-        # First, see that the card_open is still zero - this results that the player could play all card
-        print('Card open color:', card_open.color)
-        print('Card open value:', card_open.value)
-        if card_open.color == 'INIT' and card_open.value == 0:
-            for card in self.hand: self.hand_play.append(card)
+        if log.active >= log.INFO:
+            log.emit(log.INFO, "open", f'Card open color: {card_open.color}\nCard open value: {card_open.value}',
+                     color=card_open.color, value=card_open.value)
 
-        # See if there are cards played
-        else:
-            for card in self.hand:
-                if card.evaluate_card(card_open.color):
-                    self.hand_play.append(card)
+        # Playable suits come from the move table: all cards if no card is open or no color matches,
+        # otherwise the cards of the open color
+        self.move_key = sar.move_key(self.mask, card_open.suit)
+        self.play_mask = self.mask & sar.SUIT_SET_MASKS[sar.MOVE_PLAY[self.move_key]]
 
-            if len(self.hand_play) == 0: #if the playable hand is empty, that means no color matching -> all card from the hand is playable
-                for card in self.hand: self.hand_play.append(card)
+        self.play_index[:] = [i for i, card in enumerate(self.hand) if card.bit & self.play_mask]
 
-        self.show_hand_play()
+        if log.active >= log.INFO:
+            self.show_hand_play()
+
+    def remove_card(self, i):
+        """
+        Removes and returns the hand card at index i in O(1), the last hand card takes its place.
+        """
+
+        hand = self.hand
+        card = hand[i]
+        hand[i] = hand[-1]
+        hand.pop()
+        self.mask &= ~card.bit
+        return card
 
     def draw(self, deck):
 
         for i in range(0, 8):
             card = deck.draw_from_deck()
             self.hand.append(card)
-            print(f'{self.name} draws {card.print_card()}')
+            self.mask |= card.bit
+            if log.active >= log.INFO:
+                log.emit(log.INFO, "draw", f'{self.name} draws {card.print_card()}',
+                         player=self.name, card=card.print_card())
 
     def identify_state(self, card_open):
         """
-        The state of the player is identified by looping through players' hand for each property of the state.
+        The state of the player is identified from the per-suit popcounts of the hand and playable hand masks.
         """
 
-        norm_cards = {"PIR": 2, "ZOL": 2, "TOK": 2, "MAK": 2}
-
         self.state = dict()
         self.state["OPEN"] = card_open.color
 
-        # (1) State properties: normal hand cards
-        for key, val in zip(norm_cards.keys(), norm_cards.values()):
-            self.state[key] = min(
-                [1 if (card.color == key) and (card.value in range(1, 9)) else 0 for card in self.hand].count(1), val)
+        # (1) State properties: normal hand cards, clipped at 2
+        for suit, key in enumerate(sar.SUITS):
+            self.state[key] = min(sar.POPCOUNT[self.mask >> 8 * suit & 0xFF], 2)
 
-        # (2) State properties: normal playable cards
-        for key, val in zip(norm_cards.keys(), norm_cards.values()):
-            self.state[key + "#"] = min(
-                [1 if (card.color == key) and (card.value in range(1, 9)) else 0 for card in self.hand_play].count(1),
-                val - 1)
+        # (2) State properties: normal playable cards, clipped at 1
+        for suit, key in enumerate(sar.SUITS):
+            self.state[key + "#"] = min(sar.POPCOUNT[self.play_mask >> 8 * suit & 0xFF], 1)
 
     def identify_action(self):
         """
         All actions are evaluated if they are available to the player, dependent on his hand and card_open.
         """
 
-        norm_cards = {"PIR": 2, "ZOL": 2, "TOK": 2, "MAK": 2}
-
         # (1) Action properties: normal playable cards
-        for key in norm_cards.keys():
-            self.actions[key] = min(
-                [1 if (card.color == key) and (card.value in range(1, 9)) else 0 for card in self.hand_play].count(1),
-                1)
+        for suit, key in enumerate(sar.SUITS):
+            self.actions[key] = 1 if self.play_mask >> 8 * suit & 0xFF else 0
 
 
-    def play_agent(self, card_open):
+    def play_agent(self, card_open, turn):
         """
         Reflecting a players' intelligent move supported by the RL-algorithm, that consists of:
             - Identification of the players' state and available actions
@@ -169,73 +205,85 @@ class Player(object):
             - Update Q-values in case of TD
 
         Required parameters:
-            - deck as deck
             - card_open as card
+            - turn as Turn, the trick so far (for encoders that look beyond the hand)
         """
-        self.evaluate_hand(card_open)
+        timing = instrument.phases
+        agent = self.agent
 
-        # Identify state & actions for action selection
-        self.identify_state(card_open)
-        self.identify_action()
+        # The move may already be chosen together with other agent seats of the trick (Turn.plan)
+        if self.planned is None:
+            if timing: t = perf_counter()
 
-        # Agent selects action
-        self.action = agent.step(self.state, self.actions)
+            self.evaluate_hand(card_open)
+            if timing: t = timing.lap("evaluate_hand", t)
 
-        # Selected action searches corresponding card
+            # Identify state by the agent's encoder & actions by move table lookup
+            self.state = agent.encoder.encode(self, turn)
+            if timing: t = timing.lap("identify_state", t)
 
-        # (1) Playing normal card with different color
-        if (self.action in ["PIR", "ZOL", "TOK", "MAK"]) and (self.action != card_open.color):
-            for card in self.hand:
-                if (card.color == self.action) and (card.value in range(1, 9)):
-                    break
+            # Agent selects action
+            self.action = sar.SUITS[agent.act(self.state, sar.MOVE_ACTIONS[self.move_key])]
+            if timing: t = timing.lap("agent.step", t)
+        else:
+            self.action = sar.SUITS[self.planned]
+            self.planned = None
 
-        # (2) Playing normal card with same color
-        elif (self.action in ["PIR", "ZOL", "TOK", "MAK"]) and (self.action == card_open.color):
-            for card in self.hand:
-                if (card.color == self.action) and (card.value in range(1, 9)):
-                    break
+        if self.trace is not None:
+            self.trace.decision(self.order, self.state, SUIT_RANK[self.action])
 
+        # Selected action searches corresponding card among the playable ones
+        suit = SUIT_RANK[self.action]
+        for i in self.play_index:
+            if self.hand[i].suit == suit:
+                break
 
         # Selected card is played
+        card = self.remove_card(i)
         self.card_play = card
-        self.hand.remove(card)
-        self.hand_play.pop()
-        print(f'\n{self.name} plays {card.print_card()}')
+        if log.active >= log.INFO:
+            log.emit(log.INFO, "play", f'\n{self.name} plays {card.print_card()}',
+                     player=self.name, card=card.print_card(), agent=True)
 
 
         # Update Q Value
-        if algorithm == "q-learning":
-            agent.update(self.state, self.action)
+        if not agent.episodic:
+            if timing: t = perf_counter()
+            agent.learn(self.state, SUIT_RANK[self.action])
+            if timing: timing.lap("agent.update", t)
 
     def play_rand(self, card_open):
         """
         Reflecting a players' random move, that consists of:
-            - Shuffling players' hand cards
-            - Lopping through hand cards and choosing the first available hand card to be played
+            - Choosing one of the playable hand cards with a single draw
             - Remove card from hand & replace card_open with it
 
         Required parameters: deck as deck
         """
+        timing = instrument.phases
+        if timing: t = perf_counter()
+
         self.evaluate_hand(card_open)
-        random.shuffle(self.hand_play)
-        for card in self.hand:
-            if card == self.hand_play[-1]:
-                self.card_play = card
-                self.hand.remove(card)
-                self.hand_play.pop()
-                print(f'\n{self.name} plays {card.print_card()}')
-                break
+        if timing: t = timing.lap("evaluate_hand", t)
+
+        card = self.remove_card(self.rng.choice(self.play_index))
+        self.card_play = card
+        if log.active >= log.INFO:
+            log.emit(log.INFO, "play", f'\n{self.name} plays {card.print_card()}',
+                     player=self.name, card=card.print_card(), agent=False)
+
+        if timing: timing.lap("play_rand", t)
 
 
     def show_hand(self):
-        underline(f'\n{self.name}s hand:')
+        print(log.underline(f'\n{self.name}s hand:'))
         for card in self.hand:
             card.show_card()
 
     def show_hand_play(self):
-        underline(f'\n{self.name}s playable hand:')
-        for card in self.hand_play:
-            card.show_card()
+        cards = [self.hand[i].print_card() for i in self.play_index]
+        log.emit(log.INFO, "hand_play", "\n".join([log.underline(f'\n{self.name}s playable hand:')] + cards),
+                 player=self.name, cards=cards)
 
 class Turn(object):
     """
@@ -256,15 +304,20 @@ class Turn(object):
         self.player_4 = player_4
         self.disc = list()
         #self.start_up()
+        self.reset()
+
+    def reset(self):
+        self.disc.clear()
         self.number_of_turn = 0
         self.card_open = 0
         self.losing_card = 0
         self.loser = 0
+        self.leader = 0
 
     def action(self, player):
         """
         Only reflecting the active players' action if he hand has not won yet.
-        Only one player is leveraging the RL-algorithm, while the other makes random choices.
+        Players with an agent leverage the RL-algorithm, the others make random choices.
         """
 
         player_act = player
@@ -273,9 +326,10 @@ class Turn(object):
             player_act.play_rand(self.card_open) #to be updated to play optimal opening card
             self.card_open = player_act.card_play
             self.losing_card = player_act.card_play
+            self.leader = player_act
         else:
-            if player_act == self.player_1:
-                player_act.play_agent(self.card_open)
+            if player_act.agent is not None:
+                player_act.play_agent(self.card_open, self)
             else:
                 player_act.play_rand(self.card_open)
 
@@ -287,46 +341,139 @@ class Turn(object):
                 if self.losing_card.value < player_act.card_play.value:
                     self.loser = player_act
 
-        print('Current loser midturn',self.loser.name)
+        if log.active >= log.INFO:
+            log.emit(log.INFO, "loser", f'Current loser midturn {self.loser.name}', player=self.loser.name)
 
         self.disc.append(player_act.card_play)
 
+    def plan(self, followers):
+        """
+        The states of the seats following the leader only depend on their own hand and the open card,
+        so once the leader has played, the moves of all agent seats are chosen together: the Q-table rows
+        of seats sharing a table are fetched in one lookup, before any of these seats learns in this trick.
+        Seats whose encoder also sees the cards played before them (not batchable) move one by one.
+        """
+
+        players = [player for player in followers if player.agent is not None and player.agent.encoder.batchable]
+        if len(players) < 2:
+            return
+
+        timing = instrument.phases
+        if timing: t = perf_counter()
+
+        tables = dict()
+        for player in players:
+            player.evaluate_hand(self.card_open)
+            player.state = player.agent.encoder.encode(player, self)
+            tables.setdefault(id(player.agent.q), list()).append(player)
+
+        for group in tables.values():
+            rows = group[0].agent.q.rows([player.state for player in group])
+            for player, row in zip(group, rows):
+                player.planned = player.agent.act(player.state, sar.MOVE_ACTIONS[player.move_key], row)
+
+        if timing: timing.lap("plan", t)
+
     def clear_disc(self):
         self.disc.clear()
 
 
+class Winner(object):
+    """
+    Snapshot of the winner of a finished game: seat order, name and final points.
+    Tournaments keep these instead of the Player, which a Table resets for the next game.
+    """
+
+    __slots__ = ("order", "name", "points")
+
+    def __init__(self, player):
+        self.order = player.order
+        self.name = player.name
+        self.points = player.points
+
+
+class Table(object):
+    """
+    Players, turn and deck of four seats, kept alive across games: Game resets them in place,
+    so a tournament allocates them only once.
+    """
+
+    def __init__(self, player_1_name, player_2_name, player_3_name, player_4_name):
+        self.player_1 = Player(player_1_name, None)
+        self.player_2 = Player(player_2_name, None)
+        self.player_3 = Player(player_3_name, None)
+        self.player_4 = Player(player_4_name, None)
+        self.turn = Turn(player_1=self.player_1, player_2=self.player_2,
+                         player_3=self.player_3, player_4=self.player_4)
+        self.deck = Deck(None)
+
+    def reset(self, rng, agents, trace=None):
+        self.player_1.reset(rng, agents[0], trace)
+        self.player_2.reset(rng, agents[1], trace)
+        self.player_3.reset(rng, agents[2], trace)
+        self.player_4.reset(rng, agents[3], trace)
+        self.turn.reset()
+        self.deck.rng = rng
+
+
 class Game(object):
     """
     A game reflects an iteration of turns, until one player fulfills the winning condition of 0 hand cards.
     It initialized with two players and a turn object.
+    All random choices of the game (deck, random players, agents) come from the random stream rng.
+    agents lists the agent of every seat in player order, None for a random player (see new_agents);
+    without agents all seats play randomly.
+    With a Table its players, turn and deck are reset and reused instead of built (the player names
+    are then those of the table).
+    With a traces.TraceRecorder the deals, plays, trick losers and agent decisions are recorded.
     """
 
-    def __init__(self, player_1_name, player_2_name, player_3_name, player_4_name, comment):
+    def __init__(self, player_1_name, player_2_name, player_3_name, player_4_name, comment, rng=None,
+                 agents=None, table=None, trace=None):
 
-        if comment == False: block_print()
+        # Narration is silenced unless commented, the event sink keeps its own level
+        text_level = log.set_level(log.DEBUG if comment else log.OFF)
 
-        self.player_1 = Player(player_1_name)
-        self.player_2 = Player(player_2_name)
-        self.player_3 = Player(player_3_name)
-        self.player_4 = Player(player_4_name)
-        self.turn = Turn(player_1=self.player_1, player_2=self.player_2,
-                         player_3=self.player_3, player_4=self.player_4)
+        self.rng = rng if rng is not None else streams.RandomStream()
+        agents = agents if agents is not None else [None] * 4
+        for agent in agents:
+            if agent is not None:
+                agent.rng = self.rng
+
+        if table is None:
+            table = Table(player_1_name, player_2_name, player_3_name, player_4_name)
+        table.reset(self.rng, agents, trace)
+        if trace is not None:
+            trace.start_game()
+
+        self.player_1 = table.player_1
+        self.player_2 = table.player_2
+        self.player_3 = table.player_3
+        self.player_4 = table.player_4
+        self.turn = table.turn
+        self.deck = table.deck
 
         self.turn_no = 0
         self.winner = 0
 
+        timing = instrument.phases
+
         # With each new game the starting player is switched, in order to make it fair
         while self.winner == 0:
             self.turn_no += 1
-            bold(f'\n---------- TURN {self.turn_no} ----------')
-            # Building the deck at the start of every round
-            self.deck = Deck()
-            self.deck.shuffle()
+            if log.active >= log.INFO:
+                log.emit(log.INFO, "round", log.bold(f'\n---------- TURN {self.turn_no} ----------'), turn=self.turn_no)
+            if timing: t = perf_counter()
+            # Refilling the deck at the start of every round
+            self.deck.reset(self.rng)
+            if trace is not None:
+                trace.deal(self.turn_no % 4, self.deck.cards)
             # Every player draw from the deck
             self.player_1.draw(self.deck)
             self.player_2.draw(self.deck)
             self.player_3.draw(self.deck)
             self.player_4.draw(self.deck)
+            if timing: timing.lap("deal", t)
             # Sitting order
             self.player_1.order = 0
             self.player_2.order = 1
@@ -357,13 +504,19 @@ class Game(object):
             self.turn.number_of_turn = 0
 
             while self.turn.number_of_turn != 8:
-                bold(f'\n---------- SUB-TURN {self.turn.number_of_turn+1} ----------')
-                self.turn.card_open = Card('INIT',0) #to reset the card_open at the start of every sub-round
+                if log.active >= log.INFO:
+                    log.emit(log.INFO, "trick", log.bold(f'\n---------- SUB-TURN {self.turn.number_of_turn+1} ----------'),
+                             trick=self.turn.number_of_turn + 1)
+                self.turn.card_open = INIT #to reset the card_open at the start of every sub-round
                 self.turn.action(player=player_act)
+                self.turn.plan((player_sec, player_thi, player_four))
                 self.turn.action(player=player_sec)
                 self.turn.action(player=player_thi)
                 self.turn.action(player=player_four)
 
+                if trace is not None:
+                    trace.trick(self.turn.disc, self.turn.loser.order)
+
                 if self.turn.loser.name == self.player_1.name:
                     for card in self.turn.disc: self.player_1.disced_deck.append(card)
                     self.turn.clear_disc()
@@ -394,87 +547,435 @@ class Game(object):
                     player_four = self.player_3
 
                 self.turn.number_of_turn +=1
-                print('Loser end of the turn:', self.turn.loser.name)
+                if log.active >= log.INFO:
+                    log.emit(log.INFO, "trick_loser", f'Loser end of the turn: {self.turn.loser.name}',
+                             player=self.turn.loser.name)
 
 
 
             # Points calc
+            if timing: t = perf_counter()
             self.player_1.points_calc()
             self.player_2.points_calc()
             self.player_3.points_calc()
             self.player_4.points_calc()
 
             # Print points
-            print('Player 1 points:', self.player_1.points)
-            print('Player 2 points:', self.player_2.points)
-            print('Player 3 points:', self.player_3.points)
-            print('Player 4 points:', self.player_4.points)
+            if log.active >= log.INFO:
+                players = [self.player_1, self.player_2, self.player_3, self.player_4]
+                log.emit(log.INFO, "points", "\n".join(f'Player {i + 1} points: {p.points}' for i, p in enumerate(players)),
+                         points={p.name: p.points for p in players})
 
             # Clear disced cards
             self.player_1.clear_disc()
             self.player_2.clear_disc()
             self.player_3.clear_disc()
             self.player_4.clear_disc()
-            # Check loose
-            if check_loose(self.player_1) == True:
-                self.winner = check_winner(self.player_1,self.player_2,self.player_3,self.player_4)
-                print('Name of the winner player:',self.winner.name)
-                break
-            if check_loose(self.player_2) == True:
-                self.winner = check_winner(self.player_1,self.player_2,self.player_3,self.player_4)
-                print('Name of the winner player:',self.winner.name)
-                break
-            if check_loose(self.player_3) == True:
-                self.winner = check_winner(self.player_1,self.player_2,self.player_3,self.player_4)
-                print('Name of the winner player:',self.winner.name)
-                break
-            if check_loose(self.player_4) == True:
-                self.winner = check_winner(self.player_1,self.player_2,self.player_3,self.player_4)
-                print('Name of the winner player:',self.winner.name)
-                break
+            if timing: t = timing.lap("points_calc", t)
+            # Check loose, the game ends with the first player reaching the limit
+            for player in (self.player_1, self.player_2, self.player_3, self.player_4):
+                if check_loose(player) == True:
+                    self.winner = check_winner(self.player_1,self.player_2,self.player_3,self.player_4)
+                    if log.active >= log.INFO:
+                        log.emit(log.INFO, "winner", f'Name of the winner player: {self.winner.name}', player=self.winner.name)
+                    break
+            if timing: timing.lap("check_winner", t)
 
-        #self.player_1.identify_state(self.turn.card_open)
-        #agent.update(self.player_1.state, self.player_1.action)
+        # Monte Carlo learns once per episode, from the terminal state of each agent seat without hand cards
+        for player in (self.player_1, self.player_2, self.player_3, self.player_4):
+            if player.agent is not None and player.action != 0:
+                player.move_key = sar.move_key(player.mask, self.turn.card_open.suit)
+                s, a = player.agent.encoder.encode(player, self.turn), SUIT_RANK[player.action]
+                if trace is not None:
+                    trace.decision(player.order, s, a, terminal=True)
+                if player.agent.episodic:
+                    player.agent.learn(s, a)
 
-        if comment == False: enable_print()
+        log.set_level(text_level)
 
 
-def tournament(iterations, algo, comment, agent_info):
+def tournament(iterations, algo, comment, agent_info, progress=True, phases=False, profile_every=None,
+               profile_dir="profiles", checkpoint_dir=None, checkpoint_every=None, checkpoint_seconds=None,
+               resume=False, seed=None, agent_seats=(0,), shared=True, trace_dir=None, report=True):
     """
     A function that iterates various Games and outputs summary statistics over all executed simulations.
+    Returns the winners (as Winner snapshots), turns and coverage per game.
+    With progress=False the notebook progress bar and its refresh pause are skipped (headless runs).
+    With phases=True the per-phase timers of instrument are collected and returned as fourth value.
+    With profile_every=N every N-th game runs under cProfile, its stats are dumped to profile_dir.
+    With checkpoint_dir the tables are checkpointed in the background every checkpoint_every games and/or
+    checkpoint_seconds seconds. resume=True continues from the latest checkpoint there (tables, game
+    counter and seed); the returned lists then only cover the games played in this run.
+    Every game plays on its own random stream spawned from seed, so runs with a seed are reproducible.
+    agent_seats and shared select the self-play seats (see new_agents); the agent of the first agent seat
+    is available as alabujos.agent, it is the one recorded in coverage and checkpoints (so checkpoint_dir
+    requires shared tables when there are several agent seats).
+    With trace_dir the games are appended to a binary trace there, for offline learning (see traces.learn).
+    With report=False the closing duration line is not printed.
     """
 
     timer_start = time.time()
 
+    if checkpoint_dir is not None and not shared and len(agent_seats) > 1:
+        raise ValueError("Checkpoints only hold the tables of the first agent seat, use shared tables")
+    if checkpoint_dir is not None:
+        encoders.require_dense(agent_info, "Checkpointing")
+    if trace_dir is not None:
+        encoders.require_dense(agent_info, "Tracing")
+
     # Selection of algorithm
-    global agent, algorithm
-    algorithm = algo
+    global agent
+    agents = new_agents(algo, agent_info, agent_seats, shared)
+    agent = agents[agent_seats[0]]
+    table = Table("Bernhard", "Magdalena", "Yusuf", "Petrov")
+
+    winners, turns, coverage = list(), list(), list()
+
+    # Checkpointing and resume
+    start, checkpointer = 0, None
+    seeds = streams.seed_sequence(seed)
+    if checkpoint_dir is not None:
+        latest = checkpoint.latest(checkpoint_dir) if resume else None
+        if latest is not None:
+            if latest["games"] > iterations:
+                raise ValueError(f'The latest checkpoint already has {latest["games"]} games, more than {iterations}')
+            agent.load(latest["model_path"])
+            if shared:
+                share_tables(agents)
+            start = latest["games"]
+            seeds = streams.seed_sequence(latest["entropy"], start)
+
+        if checkpoint_every or checkpoint_seconds:
+            checkpointer = checkpoint.Checkpointer(checkpoint_dir, checkpoint_every, checkpoint_seconds)
+            checkpointer.last_games = start
+
+    recorder = traces.TraceRecorder(trace_dir) if trace_dir is not None else None
+
+    if phases:
+        instrument.enable()
+
+    # The notebook progress bar pulls in ipywidgets, so it is only imported when shown
+    if progress:
+        from tqdm.notebook import tqdm
+
+    for i in (tqdm(range(start, iterations)) if progress else range(start, iterations)):
+        if progress:
+            time.sleep(0.01)
+
+        play = lambda: Game(player_1_name="Bernhard",
+                            player_2_name="Magdalena",
+                            player_3_name="Yusuf",
+                            player_4_name="Petrov",
+                            comment=comment,
+                            rng=streams.spawn_stream(seeds),
+                            agents=agents,
+                            table=table,
+                            trace=recorder)
+
+        if profile_every and i % profile_every == 0:
+            game = instrument.profiled(play, os.path.join(profile_dir, f'game-{i}.prof'))
+        else:
+            game = play()
+
+        winners.append(Winner(game.winner))
+        turns.append(game.turn_no)
+        coverage.append(agent.q.coverage)
+
+        if checkpointer is not None and checkpointer.due(i + 1):
+            checkpointer.submit(agent, i + 1, seeds.entropy)
+
+    if checkpointer is not None:
+        if checkpointer.last_games != iterations:
+            checkpointer.submit(agent, iterations, seeds.entropy)
+        checkpointer.close()
+
+    if recorder is not None:
+        recorder.close()
+
+    # Timer
+    timer_end = time.time()
+    timer_dur = timer_end - timer_start
+    if report:
+        print(f'Execution lasted {round(timer_dur / 60, 2)} minutes ({round((iterations - start) / timer_dur, 2)} games per second)')
+
+    if phases:
+        return winners, turns, coverage, instrument.disable().report()
+
+    return winners, turns, coverage
+
+
+def iter_tournament(iterations, algo, agent_info, comment=False, seed=None, agent_seats=(0,), shared=True):
+    """
+    Generator variant of tournament(): yields one compact record per game (see results.game_record)
+    instead of keeping Player objects, so memory stays constant. iterations=None plays until closed.
+    """
+
+    global agent
+    agents = new_agents(algo, agent_info, agent_seats, shared)
+    agent = agents[agent_seats[0]]
+    table = Table("Bernhard", "Magdalena", "Yusuf", "Petrov")
+    seeds = streams.seed_sequence(seed)
+
+    i = 0
+    while iterations is None or i < iterations:
+        timer_start = perf_counter()
+        game = Game(player_1_name="Bernhard",
+                    player_2_name="Magdalena",
+                    player_3_name="Yusuf",
+                    player_4_name="Petrov",
+                    comment=comment,
+                    rng=streams.spawn_stream(seeds),
+                    agents=agents,
+                    table=table)
+
+        yield results.game_record(game, agent.q.coverage, perf_counter() - timer_start)
+        i += 1
+
+
+def stream_tournament(iterations, algo, agent_info, folder, chunk_size=10000, seed=None):
+    """
+    Plays a tournament and appends its records in chunks to a columnar results folder.
+    Returns the running summary (win rates, mean/std of turns and points).
+    """
+
+    sink = results.ColumnarSink(folder, chunk_size)
+    for record in iter_tournament(iterations, algo, agent_info, seed=seed):
+        sink.write(record)
+    sink.close()
+
+    return sink.summary.report()
+
+
+def new_agent(algo, agent_info):
+    """
+    Creates and initializes the agent of the selected algorithm.
+    """
 
     if algo == "q-learning":
-        agent = ag.QLearningAgent()
+        agent_new = ag.QLearningAgent()
     else:
-        agent = ag.MonteCarloAgent()
+        agent_new = ag.MonteCarloAgent()
+
+    agent_new.agent_init(agent_info)
+    return agent_new
+
+
+def new_agents(algo, agent_info, seats=(0,), shared=True):
+    """
+    Creates the agents of a game in seat order, None for the random seats. Every agent seat keeps its own
+    prev_state/episode; with shared=True they all learn into the Q-table and visits table of the first one,
+    otherwise every seat has its own tables.
+    """
+
+    agents = [None] * 4
+    for seat in seats:
+        info = agent_info if seat == seats[0] or not shared else {**agent_info, "new_model": True, "shared_name": None}
+        agents[seat] = new_agent(algo, info)
+
+    if shared:
+        share_tables(agents)
+    return agents
+
+
+def share_tables(agents):
+    """
+    Points the tables of all agents to those of the first one.
+    """
+
+    first = next(agent for agent in agents if agent is not None)
+    for agent in agents:
+        if agent is not None:
+            agent.q, agent.visit = first.q, first.visit
+
+
+def tournament_worker(algo, agent_info, q, visit, iterations, seeds, agent_seats=(0,)):
+    """
+    Plays a share of a parallel tournament in a worker process, starting from the given Q and visit arrays.
+    The games play on random streams spawned from the worker's SeedSequence seeds.
+    Returns the game statistics and the trained arrays.
+    """
+
+    encoders.require_dense(agent_info, "Parallel training")
+
+    global agent
+
+    agents = new_agents(algo, {**agent_info, "new_model": True}, agent_seats)
+    agent = agents[agent_seats[0]]
+    table = Table("Bernhard", "Magdalena", "Yusuf", "Petrov")
+    agent.q.assign(q)
+    agent.visit.assign(visit)
 
     winners, turns, coverage = list(), list(), list()
-    agent.agent_init(agent_info)
 
-    for i in tqdm(range(iterations)):
-        time.sleep(0.01)
+    for i in range(iterations):
+        game = Game(player_1_name="Bernhard",
+                    player_2_name="Magdalena",
+                    player_3_name="Yusuf",
+                    player_4_name="Petrov",
+                    comment=False,
+                    rng=streams.spawn_stream(seeds),
+                    agents=agents,
+                    table=table)
+
+        winners.append(Winner(game.winner))
+        turns.append(game.turn_no)
+        coverage.append(agent.q.coverage)
+
+    return winners, turns, coverage, agent.q.values, agent.visit.values
 
+
+def tournament_parallel(iterations, algo, agent_info, workers=None, merge_every=100, seed=None, agent_seats=(0,),
+                        report=True):
+    """
+    Plays a tournament split across a pool of worker processes, each with its own agent copy and RNG stream.
+    After every merge_every games per worker, the workers' tables are merged visit-weighted and redistributed.
+    Returns winners, turns and coverage like tournament(), the merged agent is available as alabujos.agent.
+    All agent_seats of a worker share its tables. With report=False the closing duration line is not printed.
+    The coverage of a game is that of its worker's table, except for the last entry, which is the coverage
+    of the final merged table.
+    """
+
+    timer_start = time.time()
+    encoders.require_dense(agent_info, "Parallel training")
+
+    global agent
+    agent = new_agent(algo, agent_info)
+
+    workers = workers or os.cpu_count()
+    seeds = streams.seed_sequence(seed)
+    winners, turns, coverage = list(), list(), list()
+
+    with multiprocessing.Pool(workers) as pool:
+        played = 0
+
+        while played < iterations:
+            # Spread the games of this merge round as evenly as possible over the workers
+            batch = min(merge_every * workers, iterations - played)
+            shares = [batch // workers + (1 if w < batch % workers else 0) for w in range(workers)]
+            shares = [share for share in shares if share > 0]
+
+            tasks = [(algo, agent_info, agent.q.values, agent.visit.values, share, child, agent_seats)
+                     for share, child in zip(shares, seeds.spawn(len(shares)))]
+            results = pool.starmap(tournament_worker, tasks)
+
+            for res in results:
+                winners.extend(res[0])
+                turns.extend(res[1])
+                coverage.extend(res[2])
+
+            merge_tables(agent.q, agent.visit, [(res[3], res[4]) for res in results])
+            played += batch
+
+    # The entries count the tables of the workers, the last one is replaced by the merged table
+    if coverage:
+        coverage[-1] = agent.q.coverage
+
+    # Timer
+    timer_end = time.time()
+    timer_dur = timer_end - timer_start
+    if report:
+        print(f'Execution lasted {round(timer_dur / 60, 2)} minutes ({round(iterations / timer_dur, 2)} games per second)')
+
+    return winners, turns, coverage
+
+
+# Striped visit locks of a shared-memory tournament worker
+shared_locks = None
+
+
+def shared_worker_init(locks):
+    """
+    Pool initializer of tournament_shared: locks can only reach the workers by inheritance.
+    """
+
+    global shared_locks
+    shared_locks = locks
+
+
+def shared_worker(algo, agent_info, name, iterations, seeds, agent_seats=(0,)):
+    """
+    Plays a share of a shared-memory tournament: the agents attach to the tables of the block name
+    and update them in place, concurrently with the other workers. Returns the game statistics.
+    """
+
+    global agent
+
+    agents = new_agents(algo, {**agent_info, "shared_name": name, "shared_locks": shared_locks}, agent_seats)
+    agent = agents[agent_seats[0]]
+    table = Table("Bernhard", "Magdalena", "Yusuf", "Petrov")
+
+    winners, turns, coverage = list(), list(), list()
+
+    for i in range(iterations):
         game = Game(player_1_name="Bernhard",
                     player_2_name="Magdalena",
                     player_3_name="Yusuf",
                     player_4_name="Petrov",
-                    comment=comment)
+                    comment=False,
+                    rng=streams.spawn_stream(seeds),
+                    agents=agents,
+                    table=table)
 
-        winners.append(game.winner)
+        winners.append(Winner(game.winner))
         turns.append(game.turn_no)
-        coverage.append((agent.q != 0).values.sum())
+
+        # The counters see the table at attach time plus this worker's writes, not those of the others
+        coverage.append(agent.q.coverage)
+
+    agent.shared.close()
+    return winners, turns, coverage
+
+
+def tournament_shared(iterations, algo, agent_info, workers=None, seed=None, stripes=0, agent_seats=(0,),
+                      report=True):
+    """
+    Plays a tournament across a pool of worker processes that all learn into one Q-table and visits table
+    in shared memory (see qtable.SharedTables), Hogwild-style without locks and without a merge step.
+    With stripes > 0 the visit counters are guarded by that many striped locks.
+    Returns winners, turns and coverage like tournament() (in worker order), the trained agent is
+    available as alabujos.agent. With report=False the closing duration line is not printed.
+    The coverage of a game only counts the writes of its own worker, except for the last entry, which is
+    the coverage of the final table.
+    """
+
+    timer_start = time.time()
+    encoders.require_dense(agent_info, "Shared memory training")
+
+    global agent
+    agent = new_agent(algo, agent_info)
+
+    workers = workers or os.cpu_count()
+    seeds = streams.seed_sequence(seed)
+    locks = [multiprocessing.Lock() for i in range(stripes)]
+    shared = SharedTables(agent.space, agent.actions, data=(agent.q.values, agent.visit.values))
+
+    try:
+        shares = [iterations // workers + (1 if w < iterations % workers else 0) for w in range(workers)]
+        shares = [share for share in shares if share > 0]
+
+        with multiprocessing.Pool(len(shares), initializer=shared_worker_init, initargs=(locks,)) as pool:
+            tasks = [(algo, agent_info, shared.name, share, child, agent_seats)
+                     for share, child in zip(shares, seeds.spawn(len(shares)))]
+            results = pool.starmap(shared_worker, tasks)
+
+        agent.q.assign(shared.q.values)
+        agent.visit.assign(shared.visit.values)
+    finally:
+        shared.close()
+
+    winners, turns, coverage = list(), list(), list()
+    for res in results:
+        winners.extend(res[0])
+        turns.extend(res[1])
+        coverage.extend(res[2])
+    if coverage:
+        coverage[-1] = agent.q.coverage
 
     # Timer
     timer_end = time.time()
     timer_dur = timer_end - timer_start
-    print(f'Execution lasted {round(timer_dur / 60, 2)} minutes ({round(iterations / timer_dur, 2)} games per second)')
+    if report:
+        print(f'Execution lasted {round(timer_dur / 60, 2)} minutes ({round(iterations / timer_dur, 2)} games per second)')
 
     return winners, turns, coverage
 
@@ -506,3 +1007,8 @@ def check_winner(player_1,player_2,player_3,player_4):
             winner = player_4
     return winner
 
+
+if __name__ == "__main__":
+    import sys
+    import cli
+    sys.exit(cli.main())
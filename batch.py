@@ -0,0 +1,201 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Custom libraries
+import state_action_reward as sar
+
+# Public libraries
+import numpy as np
+
+
+# 2. Card encoding
+# -------------------------------------------------------------------------
+
+# Card c encodes suit c // 8 (PIR, ZOL, TOK, MAK) and value c % 8 + 1, a hand is a 32-bit mask of cards
+N_CARDS = 32
+BITS = np.int64(1) << np.arange(N_CARDS, dtype=np.int64)
+SUIT_MASKS = np.array(sar.SUIT_MASKS, dtype=np.int64)
+
+# Points per card as in Player.points_calc: PIR 10 (PIR 8: 20), MAK 6: 40
+POINTS = np.zeros(N_CARDS, dtype=np.int64)
+POINTS[0:8] = 10
+POINTS[7] = 20
+POINTS[3 * 8 + 5] = 40
+
+LOSING_POINTS = 500
+
+# Move tables of state_action_reward, see sar.move_key
+CLIPPED = np.array(sar.CLIPPED, dtype=np.int64)
+KEY_WEIGHTS = 3 ** np.arange(len(sar.SUITS) - 1, -1, -1)
+MOVE_PLAY = np.array(sar.MOVE_PLAY, dtype=np.int64)
+MOVE_STATE = np.array(sar.MOVE_STATE, dtype=np.int64)
+SUIT_SET_MASKS = np.array(sar.SUIT_SET_MASKS, dtype=np.int64)
+ACTION_BITS = np.int64(1) << np.arange(len(sar.SUITS), dtype=np.int64)
+
+# Every suit occupies one byte of a mask: popcount per byte and position of the k-th set bit per byte
+SHIFTS = 8 * np.arange(len(sar.SUITS), dtype=np.int64)
+POPCOUNT = np.array(sar.POPCOUNT, dtype=np.int64)
+SELECT = np.array([[[i for i in range(8) if b >> i & 1][k] if k < POPCOUNT[b] else 0 for k in range(8)]
+                   for b in range(256)], dtype=np.int64)
+
+
+def suit_bytes(masks):
+    """
+    Splits card masks of shape (n,) into one byte per suit, returns shape (n, 4).
+    """
+
+    return (masks[:, None] >> SHIFTS) & 0xFF
+
+
+def suit_counts(masks):
+    """
+    Counts the cards per suit of card masks of shape (n,), returns shape (n, 4).
+    """
+
+    return POPCOUNT[suit_bytes(masks)]
+
+
+def move_keys(masks, open_suit):
+    """
+    Vectorized sar.move_key for card masks and open suit ranks of shape (n,).
+    """
+
+    return (open_suit + 1) * 3 ** len(sar.SUITS) + CLIPPED[suit_bytes(masks)] @ KEY_WEIGHTS
+
+
+def draw_cards(masks, rng):
+    """
+    Draws one card uniformly from each non-empty card mask of shape (n,).
+    """
+
+    rows = np.arange(len(masks))
+    suits = suit_bytes(masks)
+    counts = POPCOUNT[suits]
+    cum = counts.cumsum(axis=1)
+
+    # Draw the k-th set bit, find its suit byte and its position within that byte
+    k = (rng.random(len(masks)) * cum[:, -1]).astype(np.int64)
+    suit = (cum <= k[:, None]).sum(axis=1)
+    k -= cum[rows, suit] - counts[rows, suit]
+
+    return suit * 8 + SELECT[suits[rows, suit], k]
+
+
+def agent_policy(agent, rng):
+    """
+    Wraps the Q-table of a trained agent into an epsilon-greedy batched policy.
+    """
+
+    def policy(states, allowed):
+        actions = agent.q.argmax_batch(states, allowed, rng)
+        explore = rng.random(len(states)) < agent.epsilon
+
+        if explore.any():
+            actions[explore] = draw_cards(allowed[explore] @ ACTION_BITS, rng)
+        return actions
+
+    return policy
+
+
+# 3. Batched game
+# -------------------------------------------------------------------------
+
+class BatchGame(object):
+    """
+    Plays n_games independent games at once with the rules of Game, holding every table in NumPy arrays.
+    Seat 0 corresponds to player_1: if a policy is given it chooses the suit seat 0 follows with,
+    otherwise seat 0 plays randomly like all other seats. The leader of a trick always plays randomly.
+
+    A policy is called as policy(states, allowed) with dense state indices of shape (n,) and the
+    available actions as bool array of shape (n, 4), and returns the chosen suit per game.
+    """
+
+    def __init__(self, n_games, policy=None, seed=None):
+
+        self.rng = np.random.default_rng(seed)
+        self.space = sar.state_space()
+        self.policy = policy
+
+        self.points = np.zeros((n_games, 4), dtype=np.int64)
+        self.turn_no = np.zeros(n_games, dtype=np.int64)
+        self.winner = np.full(n_games, -1, dtype=np.int64)
+
+        active = np.arange(n_games)
+
+        while len(active) > 0:
+            self.turn_no[active] += 1
+            self.points[active] += self.play_round(self.turn_no[active] % 4)
+
+            # Games end as soon as one player reaches the losing points, the lowest score wins
+            # (ties go to the last seat, as in check_winner)
+            done = (self.points[active] >= LOSING_POINTS).any(axis=1)
+            ended = active[done]
+            is_min = self.points[ended] == self.points[ended].min(axis=1, keepdims=True)
+            self.winner[ended] = 3 - np.argmax(is_min[:, ::-1], axis=1)
+
+            active = active[~done]
+
+    def deal(self, n):
+        """
+        Shuffles a deck per game and deals 8 cards to every seat, returns hand masks of shape (n, 4).
+        """
+
+        deck = self.rng.permuted(np.tile(np.arange(N_CARDS), (n, 1)), axis=1)
+        return BITS[deck].reshape(n, 4, 8).sum(axis=2)
+
+    def play_round(self, leader):
+        """
+        Plays the 8 tricks of a round for every game, starting with the given leader seats.
+        Returns the points collected per seat, shape (n, 4).
+        """
+
+        n = len(leader)
+        rows = np.arange(n)
+        hands = self.deal(n)
+        points = np.zeros((n, 4), dtype=np.int64)
+        leader = leader.copy()
+
+        for trick in range(8):
+            # (1) Leader plays a random card, which sets the open suit and the card to beat
+            card = draw_cards(hands[rows, leader], self.rng)
+            hands[rows, leader] &= ~BITS[card]
+            open_suit = card // 8
+            open_value = card % 8
+            loser = leader.copy()
+            trick_points = POINTS[card]
+
+            # (2) Remaining seats follow suit if they can, otherwise play any card
+            for j in range(1, 4):
+                seat = (leader + j) % 4
+                hand = hands[rows, seat]
+                key = move_keys(hand, open_suit)
+                legal = hand & SUIT_SET_MASKS[MOVE_PLAY[key]]
+
+                card = draw_cards(legal, self.rng)
+
+                if self.policy is not None:
+                    agent = np.flatnonzero(seat == 0)
+                    if len(agent) > 0:
+                        card[agent] = self.play_policy(hand[agent], key[agent])
+
+                hands[rows, seat] &= ~BITS[card]
+                trick_points += POINTS[card]
+
+                # Same check as Turn.action: the card to beat stays the leader's card
+                beats = (card // 8 == open_suit) & (card % 8 > open_value)
+                loser = np.where(beats, seat, loser)
+
+            points[rows, loser] += trick_points
+            leader = loser
+
+        return points
+
+    def play_policy(self, hand, key):
+        """
+        Asks the policy for a suit per game and plays a random card of that suit.
+        """
+
+        allowed = (MOVE_PLAY[key][:, None] & ACTION_BITS) != 0
+        suit = self.policy(MOVE_STATE[key], allowed)
+
+        return draw_cards(hand & SUIT_MASKS[suit], self.rng)
@@ -0,0 +1,216 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Custom libraries
+import alabujos as ala
+import log
+import state_action_reward as sar
+import streams
+
+# Public libraries
+import numpy as np
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+
+
+AGENT_INFO = {"epsilon": 0.2, "step_size": 0.2, "new_model": True, "seed": 0}
+ALGORITHMS = ["q-learning", "monte-carlo"]
+
+DEFAULT_THRESHOLD = 0.25
+
+
+# 2. Measurements
+# -------------------------------------------------------------------------
+
+def seed(value=0):
+    """
+    Seeds the global generators and returns a fresh random stream for games.
+    """
+
+    random.seed(value)
+    np.random.seed(value)
+    return streams.RandomStream(value)
+
+
+def best_of(func, number, repeat):
+    """
+    Runs func number times per repetition and returns the fastest seconds per call.
+    """
+
+    best = float("inf")
+    for r in range(repeat):
+        timer_start = time.perf_counter()
+        for i in range(number):
+            func()
+        best = min(best, (time.perf_counter() - timer_start) / number)
+
+    return best
+
+
+def sample_moves(algo, games):
+    """
+    Records the (state, actions) dictionaries the agent faced in a few games, to replay them in isolation.
+    """
+
+    moves = list()
+    rng = seed()
+    agents = ala.new_agents(algo, AGENT_INFO)
+    play_agent = ala.Player.play_agent
+
+    def recording(player, card_open, turn):
+        player.evaluate_hand(card_open)
+        player.identify_state(card_open)
+        player.identify_action()
+        moves.append((dict(player.state), dict(player.actions)))
+        play_agent(player, card_open, turn)
+
+    ala.Player.play_agent = recording
+    try:
+        for i in range(games):
+            ala.Game("Bernhard", "Magdalena", "Yusuf", "Petrov", comment=False, rng=rng, agents=agents)
+    finally:
+        ala.Player.play_agent = play_agent
+
+    return moves
+
+
+def run(games, repeat):
+    """
+    Runs all benchmarks and returns them as {name: {"value", "unit", "higher_is_better"}}.
+    """
+
+    results = dict()
+
+    def latency(name, seconds):
+        results[name] = {"value": seconds * 1e6, "unit": "us", "higher_is_better": False}
+
+    def throughput(name, per_second):
+        results[name] = {"value": per_second, "unit": "games/s", "higher_is_better": True}
+
+    # (1) State space and reward construction
+    seed()
+    latency("state_space", best_of(sar.StateSpace, 5, repeat))
+    states, actions = sar.states(), sar.actions()
+    latency("states", best_of(sar.states, 100, repeat))
+    latency("rewards", best_of(lambda: sar.rewards(states, actions), 20, repeat))
+
+    for algo in ALGORITHMS:
+        # (2) Agent construction
+        seed()
+        latency(f'agent_init[{algo}]', best_of(lambda: ala.new_agent(algo, AGENT_INFO), 20, repeat))
+
+        # (3) Per-call latency of step and update on recorded moves
+        moves = sample_moves(algo, 5)
+        agent = ala.new_agent(algo, AGENT_INFO)
+
+        def steps():
+            for state, actions_dict in moves:
+                agent.step(state, actions_dict)
+
+        def updates():
+            for state, actions_dict in moves:
+                agent.update(state, next(key for key, val in actions_dict.items() if val))
+
+        latency(f'step[{algo}]', best_of(steps, 1, repeat) / len(moves))
+        latency(f'update[{algo}]', best_of(updates, 1, repeat) / len(moves))
+
+        # (4) Full games and tournament
+        rng = seed()
+        agents = ala.new_agents(algo, AGENT_INFO)
+        game = lambda: ala.Game("Bernhard", "Magdalena", "Yusuf", "Petrov", comment=False, rng=rng, agents=agents)
+        throughput(f'game[{algo}]', 1 / best_of(game, games, repeat))
+
+        seed()
+        with contextlib.redirect_stdout(io.StringIO()):
+            tour = lambda: ala.tournament(games, algo, False, AGENT_INFO, progress=False, seed=0)
+            throughput(f'tournament[{algo}]', games / best_of(tour, 1, repeat))
+
+    return results
+
+
+# 3. Baseline comparison
+# -------------------------------------------------------------------------
+
+def compare(results, baseline, threshold, overrides):
+    """
+    Compares results with a baseline and returns the list of regressions as text.
+    A metric regresses if it is worse than the baseline by more than its threshold (relative).
+    """
+
+    regressions = list()
+
+    for name, base in baseline.items():
+        if name not in results:
+            continue
+
+        limit = overrides.get(name, threshold)
+        value = results[name]["value"]
+
+        if base["higher_is_better"]:
+            worse = value < base["value"] * (1 - limit)
+        else:
+            worse = value > base["value"] * (1 + limit)
+
+        change = value / base["value"] - 1 if base["value"] else 0.0
+        results[name]["baseline"] = base["value"]
+        results[name]["change"] = change
+
+        if worse:
+            regressions.append(f'{name}: {value:.2f} {base["unit"]} vs baseline {base["value"]:.2f} ({change:+.1%}, threshold {limit:.0%})')
+
+    return regressions
+
+
+def parse_overrides(items):
+    overrides = dict()
+    for item in items:
+        name, value = item.rsplit("=", 1)
+        overrides[name] = float(value)
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks of the Alabujos engine and agents.")
+    parser.add_argument("--games", type=int, default=50, help="games per throughput measurement")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions, the best one counts")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a JSON results file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative slowdown before a metric fails")
+    parser.add_argument("--metric-threshold", action="append", default=[], metavar="NAME=VALUE",
+                        help="per-metric threshold, may be repeated")
+    args = parser.parse_args(argv)
+
+    log.configure(text_level=log.OFF)
+    results = run(args.games, args.repeat)
+
+    regressions = list()
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, parse_overrides(args.metric_threshold))
+
+    for name, res in results.items():
+        change = f' ({res["change"]:+.1%})' if "change" in res else ""
+        print(f'{name:<28} {res["value"]:>12.2f} {res["unit"]}{change}')
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print("  " + line)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
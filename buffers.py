@@ -0,0 +1,113 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Public libraries
+import numpy as np
+
+
+# 2. Monte Carlo episode buffer
+# -------------------------------------------------------------------------
+
+class EpisodeBuffer(object):
+    """
+    Records the (state, action) index pairs of one episode in preallocated arrays.
+    First visits are detected with a set, so recording a step is O(1); the arrays grow by doubling.
+    """
+
+    def __init__(self, capacity=64):
+        self.states = np.empty(capacity, dtype=np.int64)
+        self.actions = np.empty(capacity, dtype=np.int64)
+        self.first = np.empty(capacity, dtype=bool)
+        self.seen = set()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, s, a):
+        if self.size == len(self.states):
+            self.grow()
+
+        pair = (s, a)
+        self.states[self.size] = s
+        self.actions[self.size] = a
+        self.first[self.size] = pair not in self.seen
+        self.seen.add(pair)
+        self.size += 1
+
+    def grow(self):
+        capacity = 2 * len(self.states)
+        for name in ("states", "actions", "first"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def clear(self):
+        self.seen.clear()
+        self.size = 0
+
+    def returns(self, reward, gamma=1.0, first_visit=True):
+        """
+        Returns states, actions and discounted returns of the recorded steps for a final reward:
+        the step t of an episode of length T receives gamma^(T-1-t) * reward.
+        With first_visit only the first occurrence of every pair is returned.
+        """
+
+        n = self.size
+        returns = reward * gamma ** np.arange(n - 1, -1, -1, dtype=np.float64)
+
+        if first_visit:
+            first = self.first[:n]
+            return self.states[:n][first], self.actions[:n][first], returns[first]
+
+        return self.states[:n], self.actions[:n], returns
+
+
+# 3. Experience replay
+# -------------------------------------------------------------------------
+
+class ReplayBuffer(object):
+    """
+    Fixed-capacity ring buffer of TD transitions (state, action, reward, next state, next action, terminal)
+    in NumPy arrays. Once full, the oldest transitions are overwritten.
+    Minibatches are drawn from the generator passed to sample(), so they follow the caller's random stream.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float64)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.next_actions = np.zeros(capacity, dtype=np.int64)
+        self.terminal = np.zeros(capacity, dtype=bool)
+        self.pos = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, s, a, reward, next_s, next_a, terminal):
+        i = self.pos
+        self.states[i] = s
+        self.actions[i] = a
+        self.rewards[i] = reward
+        self.next_states[i] = next_s
+        self.next_actions[i] = next_a
+        self.terminal[i] = terminal
+
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size, rng):
+        """
+        Returns a uniform minibatch (with replacement) as tuple of arrays in push order.
+        Required parameters:
+            - batch_size as int
+            - rng as numpy Generator
+        """
+
+        idx = rng.integers(0, self.size, size=batch_size)
+        return (self.states[idx], self.actions[idx], self.rewards[idx],
+                self.next_states[idx], self.next_actions[idx], self.terminal[idx])
@@ -0,0 +1,152 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Custom libraries
+from qtable import QTable, save_model
+
+# Public libraries
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+
+LATEST = "latest.json"
+
+
+# 2. Checkpointer
+# -------------------------------------------------------------------------
+
+class Checkpointer(object):
+    """
+    Periodically snapshots an agent's Q-table and visits table and writes them from a background thread.
+    The simulation only pays for copying two arrays; if the writer is still busy, a newer snapshot
+    replaces the pending one. A checkpoint becomes visible through an atomic rename of latest.json,
+    so a crash never leaves a half-written checkpoint behind.
+    """
+
+    def __init__(self, folder, every_games=None, every_seconds=None, keep=2):
+        """
+        Required parameters: folder as str
+        Optional parameters:
+            - every_games as int, checkpoint after every N games
+            - every_seconds as float, checkpoint after T seconds since the last one
+            - keep as int, number of checkpoints kept on disk
+        """
+
+        self.folder = folder
+        self.every_games = every_games
+        self.every_seconds = every_seconds
+        self.keep = keep
+        self.last_games = 0
+        self.last_time = time.monotonic()
+
+        os.makedirs(folder, exist_ok=True)
+        self.pending = queue.Queue(maxsize=1)
+        self.error = None
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def check(self):
+        """
+        Raises the error of a failed background write, so a run does not go on without checkpoints.
+        """
+
+        if self.error is not None:
+            raise self.error
+
+    def due(self, games):
+        self.check()
+        if self.every_games and games - self.last_games >= self.every_games:
+            return True
+        if self.every_seconds and time.monotonic() - self.last_time >= self.every_seconds:
+            return True
+        return False
+
+    def submit(self, agent, games, entropy):
+        """
+        Snapshots the agent's tables, the game counter and the run's seed entropy and queues them for writing.
+        """
+
+        self.check()
+        snapshot = (agent.q.space, agent.actions, agent.q.values.copy(), agent.visit.values.copy(),
+                    games, entropy)
+        self.last_games = games
+        self.last_time = time.monotonic()
+
+        # Keep only the newest snapshot waiting
+        try:
+            self.pending.get_nowait()
+        except queue.Empty:
+            pass
+        self.pending.put(snapshot)
+
+    def close(self):
+        """
+        Waits until the pending snapshot is written and stops the writer thread.
+        """
+
+        self.pending.put(None)
+        self.thread.join()
+        self.check()
+
+    def write_loop(self):
+        while True:
+            snapshot = self.pending.get()
+            if snapshot is None:
+                return
+
+            try:
+                self.write(*snapshot)
+            except Exception as error:
+                self.error = error
+
+    def write(self, space, actions, q, visit, games, entropy):
+        name = f'ckpt-{games:012d}'
+        folder_tmp = os.path.join(self.folder, name + ".tmp")
+        shutil.rmtree(folder_tmp, ignore_errors=True)
+        os.makedirs(folder_tmp)
+
+        save_model(os.path.join(folder_tmp, "model"), QTable(space, actions, q), QTable(space, actions, visit))
+
+        folder_ckpt = os.path.join(self.folder, name)
+        shutil.rmtree(folder_ckpt, ignore_errors=True)
+        os.replace(folder_tmp, folder_ckpt)
+
+        # Publish: latest.json is swapped atomically
+        latest = {"checkpoint": name, "games": games, "entropy": entropy}
+        file_tmp = os.path.join(self.folder, LATEST + ".tmp")
+        with open(file_tmp, "w") as f:
+            json.dump(latest, f)
+        os.replace(file_tmp, os.path.join(self.folder, LATEST))
+
+        # Drop old checkpoints: keep the published one and the newest before it; higher-numbered folders
+        # are left over from an earlier run into the same folder
+        names = sorted(n for n in os.listdir(self.folder) if n.startswith("ckpt-") and not n.endswith(".tmp"))
+        before = [n for n in names if n < name]
+        kept = set(before[max(0, len(before) - self.keep + 1):]) | {name}
+        for old in names:
+            if old not in kept:
+                shutil.rmtree(os.path.join(self.folder, old), ignore_errors=True)
+
+
+# 3. Resume
+# -------------------------------------------------------------------------
+
+def latest(folder):
+    """
+    Returns the latest checkpoint of a folder as dict with model path prefix, games and seed entropy,
+    or None if there is none.
+    """
+
+    try:
+        with open(os.path.join(folder, LATEST)) as f:
+            info = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    return {"model_path": os.path.join(folder, info["checkpoint"], "model"),
+            "games": info["games"],
+            "entropy": info["entropy"]}
@@ -0,0 +1,244 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Custom libraries
+import alabujos as ala
+import evaluate as ev
+import log
+import sweep as sw
+import traces
+
+# Public libraries
+import numpy as np
+import argparse
+import sys
+import time
+
+
+# 2. Commands
+# -------------------------------------------------------------------------
+
+def positive_int(text):
+    """
+    argparse type of counts that have to be at least 1.
+    """
+
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive number')
+    return value
+
+
+def run(args):
+    """
+    Plays a headless tournament and prints a throughput and timing summary.
+    """
+
+    agent_info = {"epsilon": args.epsilon,
+                  "step_size": args.step_size,
+                  "new_model": args.model is None,
+                  "encoder": args.encoder}
+    if args.model is not None:
+        agent_info["model_path"] = args.model
+        agent_info["mmap_mode"] = "c" if args.mmap else None
+
+    # Options only the single-process tournament implements
+    if args.workers > 1:
+        for option, given in (("--separate", args.separate), ("--phases", args.phases),
+                              ("--profile-every", args.profile_every), ("--comment", args.comment),
+                              ("--trace", args.trace)):
+            if given:
+                raise SystemExit(f'{option} is only supported in a single process, use --workers 1')
+
+    # Parallel runs exchange dense arrays between processes, traces store dense state indices
+    if args.encoder != "dense" and args.workers > 1:
+        raise SystemExit(f'--encoder {args.encoder} trains in a single process, use --workers 1')
+    if args.encoder != "dense" and args.trace:
+        raise SystemExit(f'--trace records dense state indices, it cannot be combined with --encoder {args.encoder}')
+
+    # Narration (--comment) goes to the terminal
+    log.configure(text_level=log.OFF, text_stream=sys.stdout)
+    timer_start = time.perf_counter()
+
+    # The tournaments' own duration line is skipped (report=False), the summary below replaces it
+    if args.workers > 1 and args.shared:
+        winners, turns, coverage = ala.tournament_shared(args.games, args.algo, agent_info, workers=args.workers,
+                                                         seed=args.seed, stripes=args.stripes,
+                                                         agent_seats=args.agent_seats, report=False)
+        phases = None
+    elif args.workers > 1:
+        winners, turns, coverage = ala.tournament_parallel(args.games, args.algo, agent_info,
+                                                           workers=args.workers, merge_every=args.merge_every,
+                                                           seed=args.seed, agent_seats=args.agent_seats, report=False)
+        phases = None
+    else:
+        res = ala.tournament(args.games, args.algo, args.comment, agent_info, progress=False,
+                             phases=args.phases, profile_every=args.profile_every, seed=args.seed,
+                             agent_seats=args.agent_seats, shared=not args.separate, trace_dir=args.trace,
+                             report=False)
+        winners, turns, coverage = res[:3]
+        phases = res[3] if args.phases else None
+
+    timer_dur = time.perf_counter() - timer_start
+
+    if args.save:
+        ala.agent.save(args.save)
+
+    # Summary
+    # Wins of any agent seat, the win rate of a single seat against random play is 0.25
+    agent_wins = sum(1 for winner in winners if winner.order in args.agent_seats)
+    print(f'Games:           {args.games}')
+    print(f'Algorithm:       {args.algo}')
+    print(f'Duration:        {timer_dur:.2f} s')
+    print(f'Throughput:      {args.games / timer_dur:.2f} games/s')
+    print(f'Mean turns:      {np.mean(turns):.2f}')
+    print(f'Agent win rate:  {agent_wins / args.games:.3f}')
+    print(f'Coverage:        {coverage[-1]} state-action pairs')
+
+    if phases:
+        print("\nPhase                  seconds      calls    mean us")
+        for phase, res in phases.items():
+            print(f'{phase:<18} {res["seconds"]:>11.3f} {res["calls"]:>10} {res["mean_us"]:>10.2f}')
+
+    return 0
+
+
+def evaluate(args):
+    """
+    Evaluates a stored model greedily against random opponents and prints the estimates.
+    """
+
+    agent_info = {"epsilon": 0.0,
+                  "step_size": 0.0,
+                  "new_model": False,
+                  "model_path": args.model}
+    policy = ala.new_agent(args.algo, agent_info).freeze(args.seed)
+
+    res = ev.evaluate(policy, max_games=args.max_games, width=args.width, points_width=args.points_width,
+                      p0=args.p0, p1=args.p1, batch_size=args.batch_size, engine=args.engine, seed=args.seed)
+
+    print(f'Games:           {res["games"]}')
+    print(f'Win rate:        {res["win_rate"]:.3f} [{res["win_rate_ci"][0]:.3f}, {res["win_rate_ci"][1]:.3f}]')
+    print(f'Mean points:     {res["points_mean"]:.1f} [{res["points_ci"][0]:.1f}, {res["points_ci"][1]:.1f}]')
+    if res["sprt"] is not None:
+        print(f'SPRT:            {res["sprt"]} than {args.p0:.2f} (llr {res["llr"]:.2f})')
+    print(f'Stopped by:      {res["stopped"]}')
+
+    return 0
+
+
+def learn(args):
+    """
+    Trains an agent offline from a recorded trace and stores the model.
+    """
+
+    agent_info = {"epsilon": 0.0,
+                  "step_size": args.step_size,
+                  "new_model": args.model is None}
+    if args.model is not None:
+        agent_info["model_path"] = args.model
+    agent = ala.new_agent(args.algo, agent_info)
+
+    timer_start = time.perf_counter()
+    games = traces.learn(agent, args.trace, batch_games=args.batch_games)
+    timer_dur = time.perf_counter() - timer_start
+
+    agent.save(args.save)
+    print(f'Games:           {games}')
+    print(f'Duration:        {timer_dur:.2f} s')
+    print(f'Throughput:      {games / timer_dur:.2f} games/s')
+    print(f'Coverage:        {agent.q.coverage} state-action pairs')
+
+    return 0
+
+
+def sweep(args):
+    """
+    Runs a hyperparameter sweep with successive halving and prints the ranked results.
+    """
+
+    if args.random:
+        configs = sw.random_search(args.random, seed=args.seed, algo=args.algo,
+                                   epsilon=(min(args.epsilon), max(args.epsilon)),
+                                   step_size=(min(args.step_size), max(args.step_size)))
+    else:
+        configs = sw.grid(algo=args.algo, epsilon=args.epsilon, step_size=args.step_size)
+
+    rows = sw.successive_halving(configs, min_games=args.min_games, max_games=args.max_games, eta=args.eta,
+                                 eval_games=args.eval_games, workers=args.workers, seed=args.seed)
+
+    print("Rank  Algorithm     epsilon  step_size   games  win rate")
+    for rank, row in enumerate(rows, 1):
+        print(f'{rank:>4}  {row["algo"]:<12} {row["epsilon"]:>8.3f} {row["step_size"]:>10.3f} '
+              f'{row["games"]:>7} {row["win_rate"]:>9.3f}')
+
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m alabujos", description="Headless Alabujos simulations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_run = commands.add_parser("run", help="play a tournament")
+    parser_run.add_argument("--games", type=positive_int, default=100)
+    parser_run.add_argument("--algo", choices=["q-learning", "monte-carlo"], default="q-learning")
+    parser_run.add_argument("--epsilon", type=float, default=0.2)
+    parser_run.add_argument("--step-size", type=float, default=0.2)
+    parser_run.add_argument("--model", help="load the model stored under this path prefix")
+    parser_run.add_argument("--mmap", action="store_true", help="memory-map the loaded model (copy-on-write)")
+    parser_run.add_argument("--save", help="store the trained model under this path prefix")
+    parser_run.add_argument("--seed", type=int)
+    parser_run.add_argument("--encoder", choices=["dense", "rich"], default="dense",
+                            help="state encoding, rich learns on a sparse hashed Q-table")
+    parser_run.add_argument("--workers", type=int, default=1, help="worker processes, >1 plays in parallel")
+    parser_run.add_argument("--merge-every", type=int, default=100, help="games per worker between table merges")
+    parser_run.add_argument("--shared", action="store_true",
+                            help="workers learn into one table in shared memory instead of merging copies")
+    parser_run.add_argument("--stripes", type=int, default=0, help="striped locks for the shared visit counters")
+    parser_run.add_argument("--agent-seats", type=int, nargs="+", default=[0], choices=range(4),
+                            help="seats played by agents (self-play), 0 is player_1")
+    parser_run.add_argument("--separate", action="store_true", help="one Q-table per agent seat instead of a shared one")
+    parser_run.add_argument("--trace", help="append the games to a binary trace in this folder")
+    parser_run.add_argument("--comment", action="store_true", help="narrate the games")
+    parser_run.add_argument("--phases", action="store_true", help="report per-phase timings")
+    parser_run.add_argument("--profile-every", type=int, help="cProfile every N-th game into ./profiles")
+    parser_run.set_defaults(func=run)
+
+    parser_eval = commands.add_parser("evaluate", help="evaluate a stored model without learning")
+    parser_eval.add_argument("--model", required=True, help="path prefix of the stored model")
+    parser_eval.add_argument("--algo", choices=["q-learning", "monte-carlo"], default="q-learning")
+    parser_eval.add_argument("--max-games", type=int, default=100000)
+    parser_eval.add_argument("--width", type=float, default=0.02, help="target width of the win rate interval")
+    parser_eval.add_argument("--points-width", type=float, default=10.0, help="target width of the points interval")
+    parser_eval.add_argument("--p0", type=float, default=0.25, help="SPRT null win rate")
+    parser_eval.add_argument("--p1", type=float, default=0.30, help="SPRT alternative win rate")
+    parser_eval.add_argument("--batch-size", type=int, default=500, help="games between stopping checks")
+    parser_eval.add_argument("--engine", choices=["batch", "object"], default="batch")
+    parser_eval.add_argument("--seed", type=int)
+    parser_eval.set_defaults(func=evaluate)
+
+    parser_learn = commands.add_parser("learn", help="train offline from a recorded trace")
+    parser_learn.add_argument("--trace", required=True, help="trace folder written by run --trace")
+    parser_learn.add_argument("--algo", choices=["q-learning", "monte-carlo"], default="q-learning")
+    parser_learn.add_argument("--step-size", type=float, default=0.2)
+    parser_learn.add_argument("--model", help="continue from the model stored under this path prefix")
+    parser_learn.add_argument("--save", required=True, help="store the trained model under this path prefix")
+    parser_learn.add_argument("--batch-games", type=int, default=1000, help="games per vectorized update")
+    parser_learn.set_defaults(func=learn)
+
+    parser_sweep = commands.add_parser("sweep", help="tune hyperparameters with successive halving")
+    parser_sweep.add_argument("--algo", nargs="+", choices=["q-learning", "monte-carlo"],
+                              default=["q-learning", "monte-carlo"])
+    parser_sweep.add_argument("--epsilon", type=float, nargs="+", default=[0.05, 0.1, 0.2, 0.4])
+    parser_sweep.add_argument("--step-size", type=float, nargs="+", default=[0.05, 0.1, 0.2, 0.4])
+    parser_sweep.add_argument("--random", type=int, help="sample N configurations within the ranges instead of the grid")
+    parser_sweep.add_argument("--min-games", type=int, default=100, help="training games of the first rung")
+    parser_sweep.add_argument("--max-games", type=int, default=2700, help="training games of the last rung")
+    parser_sweep.add_argument("--eta", type=int, default=3, help="keep the best 1/eta per rung")
+    parser_sweep.add_argument("--eval-games", type=int, default=2000, help="evaluation games per rung")
+    parser_sweep.add_argument("--workers", type=int, help="worker processes, default all cores")
+    parser_sweep.add_argument("--seed", type=int)
+    parser_sweep.set_defaults(func=sweep)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,168 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Custom libraries
+import state_action_reward as sar
+from qtable import QTable, SparseQTable
+
+# Public libraries
+import numpy as np
+
+
+# 2. Encoders
+# -------------------------------------------------------------------------
+
+# An encoder turns the situation of an agent seat into the state the agent learns on. It provides
+#     - encode(player, turn): state of the player at its move (or at the end of the game)
+#     - from_dict(state_dict): state of a Player.identify_state dict (agent.step/update)
+#     - table(actions): empty table for its states
+#     - rewards(actions): reward lookup with get(s, a) and lookup(s, a) on its states
+#     - label(s): readable form of a state for logs
+#     - layout(): description stored with models, so models of another encoding are rejected
+# sparse tells whether states are keys of a SparseQTable instead of dense indices; traces, frozen
+# policies, checkpoints, the batch engine and shared memory need dense indices.
+# batchable tells whether the state of a follower only depends on its hand and the open card,
+# so Turn.plan may choose the moves of several seats at once.
+
+
+class DenseEncoder(object):
+    """
+    The default encoding: open suit plus per-suit hand counts clipped at 2 and playable counts clipped at 1,
+    as dense index of the StateSpace (looked up in the move tables).
+    """
+
+    sparse = False
+    batchable = True
+
+    def encode(self, player, turn):
+        return sar.MOVE_STATE[player.move_key]
+
+    def from_dict(self, state_dict):
+        return sar.state_space().encode(state_dict)
+
+    def table(self, actions):
+        return QTable(sar.state_space(), actions)
+
+    def rewards(self, actions):
+        return QTable(sar.state_space(), actions, sar.reward_table(len(actions)))
+
+    def label(self, s):
+        return sar.state_space().states[s]
+
+    def layout(self):
+        return sar.state_space().layout()
+
+
+class RichEncoder(object):
+    """
+    Encoding with the information the dense one clips away: unclipped hand and playable counts per suit,
+    the position in the trick, the value of the card losing the trick so far, whether PIR 8 and MAK 6
+    are held and the points so far in buckets of 50. States are mixed-radix int64 keys of a space of
+    ~10^11 states, of which only the visited ones are stored (SparseQTable).
+    """
+
+    sparse = True
+    batchable = False
+
+    # Mixed-radix digits of a key, most significant first
+    RADICES = [("open", len(sar.SUITS)),
+               ("hand", 9 ** len(sar.SUITS)),
+               ("playable", 9 ** len(sar.SUITS)),
+               ("position", 4),
+               ("losing", 9),
+               ("pir_8", 2),
+               ("mak_6", 2),
+               ("points", 11)]
+
+    PIR_8 = 1 << (sar.SUITS.index("PIR") * 8 + 7)
+    MAK_6 = 1 << (sar.SUITS.index("MAK") * 8 + 5)
+
+    def encode(self, player, turn):
+        mask, playable = player.mask, player.mask & player.play_mask
+        popcount = sar.POPCOUNT
+
+        key = max(turn.card_open.suit, 0)
+        for suit in range(4):
+            key = key * 9 + popcount[mask >> 8 * suit & 0xFF]
+        for suit in range(4):
+            key = key * 9 + popcount[playable >> 8 * suit & 0xFF]
+
+        if turn.disc:
+            key = (key * 4 + (player.order - turn.leader.order) % 4) * 9 + turn.losing_card.value
+        else:
+            key = key * 36
+
+        key = (key * 2 + (mask & self.PIR_8 != 0)) * 2 + (mask & self.MAK_6 != 0)
+        return key * 11 + min(player.points // 50, 10)
+
+    def from_dict(self, state_dict):
+        raise ValueError("State dicts only carry the dense features, use act/learn with RichEncoder states")
+
+    def decode(self, s):
+        """
+        Returns the digits of a key as dict, hand and playable counts as tuples per suit.
+        """
+
+        digits = dict()
+        for name, radix in reversed(self.RADICES):
+            s, digits[name] = divmod(s, radix)
+
+        for name in ("hand", "playable"):
+            counts, rest = list(), digits[name]
+            for suit in range(len(sar.SUITS)):
+                rest, count = divmod(rest, 9)
+                counts.insert(0, count)
+            digits[name] = tuple(counts)
+
+        digits["open"] = sar.SUITS[digits["open"]]
+        return {name: digits[name] for name, radix in self.RADICES}
+
+    def table(self, actions):
+        return SparseQTable(actions)
+
+    def rewards(self, actions):
+        return KeyRewards(self)
+
+    def label(self, s):
+        return self.decode(s)
+
+    def layout(self):
+        return {"encoding": "rich", "version": 1, "radices": [radix for name, radix in self.RADICES]}
+
+
+class KeyRewards(object):
+    """
+    Reward of 1 for every action of a state key without hand cards, 0 otherwise, computed from the key.
+    """
+
+    def __init__(self, encoder):
+        radices = [radix for name, radix in encoder.RADICES]
+        self.below = int(np.prod(radices[2:]))
+        self.radix = radices[1]
+
+    def get(self, s, a):
+        return 1.0 if s // self.below % self.radix == 0 else 0.0
+
+    def lookup(self, s, a):
+        return (np.asarray(s) // self.below % self.radix == 0).astype(np.float64)
+
+
+ENCODERS = {"dense": DenseEncoder, "rich": RichEncoder}
+
+
+def encoder(name):
+    """
+    Returns the encoder of the given name ("dense" or "rich").
+    """
+
+    return ENCODERS[name]()
+
+
+def require_dense(agent_info, feature):
+    """
+    Raises ValueError if agent_info selects a sparse encoder, for features that work on dense state indices.
+    """
+
+    name = agent_info.get("encoder", "dense")
+    if ENCODERS[name].sparse:
+        raise ValueError(f'{feature} needs the dense state encoding, not "{name}"')
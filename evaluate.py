@@ -0,0 +1,166 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Custom libraries
+import alabujos as ala
+import batch
+import encoders
+import streams
+from results import RunningStats
+
+# Public libraries
+import numpy as np
+import math
+from statistics import NormalDist
+
+
+# 2. Sequential test
+# -------------------------------------------------------------------------
+
+class SPRT(object):
+    """
+    Wald's sequential probability ratio test for the win rate p of a seat: H0 p = p0 against H1 p = p1.
+    Games are added as they are played; the test decides as soon as the log-likelihood ratio
+    leaves the band given by the error rates alpha (accepting H1 wrongly) and beta (accepting H0 wrongly).
+    """
+
+    def __init__(self, p0=0.25, p1=0.30, alpha=0.05, beta=0.05):
+        self.p0 = p0
+        self.p1 = p1
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+        self.llr_win = math.log(p1 / p0)
+        self.llr_loss = math.log((1 - p1) / (1 - p0))
+        self.llr = 0.0
+
+    def update(self, wins, games):
+        self.llr += wins * self.llr_win + (games - wins) * self.llr_loss
+
+    @property
+    def decision(self):
+        """
+        "better" if H1 is accepted, "not better" if H0 is accepted, None while undecided.
+        """
+
+        if self.llr >= self.upper:
+            return "better"
+        if self.llr <= self.lower:
+            return "not better"
+        return None
+
+
+def wilson_interval(wins, games, z):
+    """
+    Wilson score interval of a binomial proportion.
+    """
+
+    if games == 0:
+        return 0.0, 1.0
+
+    p = wins / games
+    center = (p + z * z / (2 * games)) / (1 + z * z / games)
+    half = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return center - half, center + half
+
+
+# 3. Frozen agent
+# -------------------------------------------------------------------------
+
+class FrozenAgent(object):
+    """
+    Stands in for the learning agent of a Game: moves come greedily from a Policy, learning is a no-op.
+    """
+
+    episodic = False
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.encoder = encoders.encoder("dense")
+        self.prev_state = None
+        self.rng = None
+
+    def act(self, s, allowed, row=None):
+        return self.policy.act(s, sum(1 << a for a in allowed))
+
+    def learn(self, s, a):
+        pass
+
+
+def play_batch(policy, n_games, seeds, engine):
+    """
+    Plays n_games with the policy in seat 0, returns winner seats and seat 0 points as arrays.
+    """
+
+    if engine == "batch":
+        games = batch.BatchGame(n_games, policy=policy, seed=seeds.spawn(1)[0])
+        return games.winner, games.points[:, 0]
+
+    agents = [FrozenAgent(policy), None, None, None]
+    table = ala.Table("Bernhard", "Magdalena", "Yusuf", "Petrov")
+    winners, points = np.zeros(n_games, dtype=np.int64), np.zeros(n_games, dtype=np.int64)
+    for i in range(n_games):
+        game = ala.Game(player_1_name="Bernhard",
+                        player_2_name="Magdalena",
+                        player_3_name="Yusuf",
+                        player_4_name="Petrov",
+                        comment=False,
+                        rng=streams.spawn_stream(seeds),
+                        agents=agents,
+                        table=table)
+        winners[i] = game.winner.order
+        points[i] = game.player_1.points
+
+    return winners, points
+
+
+# 4. Evaluation
+# -------------------------------------------------------------------------
+
+def evaluate(policy, max_games=100000, width=0.02, points_width=10.0, confidence=0.95, p0=0.25, p1=0.30,
+             alpha=0.05, beta=0.05, batch_size=500, engine="batch", seed=None):
+    """
+    Evaluates a frozen policy (see agent.freeze()) in seat 0 against random opponents, without learning.
+    Games are played in batches of batch_size until
+        - the SPRT of "win rate p0 vs p1" decides (skipped with p0=None), or
+        - the confidence intervals of win rate and mean points are narrower than width and points_width, or
+        - max_games are played.
+    engine="batch" plays on batch.BatchGame, engine="object" on alabujos.Game.
+    Returns games used, the estimates with their intervals, the test decision and the stopping reason.
+    """
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    seeds = streams.seed_sequence(seed)
+    sprt = SPRT(p0, p1, alpha, beta) if p0 is not None else None
+    wins, points = 0, RunningStats()
+
+    stopped = "budget"
+    while points.n < max_games:
+        n = min(batch_size, max_games - points.n)
+        winners, seat_points = play_batch(policy, n, seeds, engine)
+
+        batch_wins = int((winners == 0).sum())
+        wins += batch_wins
+        for value in seat_points.tolist():
+            points.update(value)
+
+        if sprt is not None:
+            sprt.update(batch_wins, n)
+            if sprt.decision is not None:
+                stopped = "sprt"
+                break
+
+        low, high = wilson_interval(wins, points.n, z)
+        points_half = z * points.std / math.sqrt(points.n)
+        if high - low <= width and 2 * points_half <= points_width:
+            stopped = "width"
+            break
+
+    points_half = z * points.std / math.sqrt(points.n)
+    return {"games": points.n,
+            "win_rate": wins / points.n,
+            "win_rate_ci": wilson_interval(wins, points.n, z),
+            "points_mean": points.mean,
+            "points_ci": (points.mean - points_half, points.mean + points_half),
+            "sprt": sprt.decision if sprt is not None else None,
+            "llr": sprt.llr if sprt is not None else None,
+            "stopped": stopped}
@@ -0,0 +1,83 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Public libraries
+from time import perf_counter
+import cProfile
+import os
+
+
+# 2. Phase counters
+# -------------------------------------------------------------------------
+
+class Phases(object):
+    """
+    Accumulates monotonic-clock seconds and call counts per hot-path phase.
+    Call sites only pay for a None check while instrumentation is off:
+        timing = instrument.phases
+        if timing: t = perf_counter()
+        ... phase ...
+        if timing: t = timing.lap("phase", t)
+    """
+
+    def __init__(self):
+        self.seconds = dict()
+        self.calls = dict()
+
+    def add(self, phase, seconds):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def lap(self, phase, start):
+        """
+        Books the time since start to the phase and returns the current clock as start of the next phase.
+        """
+
+        now = perf_counter()
+        self.add(phase, now - start)
+        return now
+
+    def report(self):
+        """
+        Returns {phase: {"seconds", "calls", "mean_us"}}, sorted by total seconds.
+        """
+
+        phases = sorted(self.seconds, key=self.seconds.get, reverse=True)
+        return {phase: {"seconds": self.seconds[phase],
+                        "calls": self.calls[phase],
+                        "mean_us": self.seconds[phase] / self.calls[phase] * 1e6} for phase in phases}
+
+
+# Active counters, None while instrumentation is off
+phases = None
+
+
+def enable():
+    global phases
+    phases = Phases()
+    return phases
+
+
+def disable():
+    global phases
+    collected, phases = phases, None
+    return collected
+
+
+# 3. Profiling hook
+# -------------------------------------------------------------------------
+
+def profiled(func, path):
+    """
+    Runs func under cProfile, dumps the statistics to path and returns func's result.
+    """
+
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func)
+    profiler.dump_stats(path)
+
+    return result
@@ -0,0 +1,85 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Public libraries
+import json
+import sys
+
+
+# 2. Levels and state
+# -------------------------------------------------------------------------
+
+OFF, INFO, DEBUG = 0, 1, 2
+
+# Text narration: level and output stream (sys.stdout if None)
+level = OFF
+stream = None
+
+# Machine-readable events: JSON lines written to sink up to sink_level
+sink = None
+sink_level = OFF
+
+# Highest level any output listens to. Call sites check it before formatting anything:
+#     if log.active >= log.INFO: log.emit(log.INFO, "play", f'...', player=...)
+active = OFF
+
+
+def refresh():
+    global active
+    active = max(level, sink_level if sink is not None else OFF)
+
+
+def configure(text_level=None, text_stream=None, event_sink=None, event_level=None):
+    """
+    Sets the narration level/stream and the event sink/level. Arguments left at None are not changed.
+    """
+
+    global level, stream, sink, sink_level
+
+    if text_level is not None:
+        level = text_level
+    if text_stream is not None:
+        stream = text_stream
+    if event_sink is not None:
+        sink = event_sink
+    if event_level is not None:
+        sink_level = event_level
+
+    refresh()
+
+
+def set_level(text_level):
+    """
+    Sets the narration level and returns the previous one, so it can be restored afterwards.
+    """
+
+    global level
+
+    previous = level
+    level = text_level
+    refresh()
+
+    return previous
+
+
+# 3. Output
+# -------------------------------------------------------------------------
+
+def emit(lvl, event, text=None, **fields):
+    """
+    Writes text to the narration stream and the event with its fields to the sink, each if enabled for lvl.
+    """
+
+    if text is not None and lvl <= level:
+        print(text, file=stream or sys.stdout)
+
+    if sink is not None and lvl <= sink_level:
+        sink.write(json.dumps({"event": event, **fields}, default=str) + "\n")
+
+
+def bold(string):
+    return "\033[1m" + string + "\033[0m"
+
+
+def underline(string):
+    return "\033[4m" + string + "\033[0m"
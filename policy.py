@@ -0,0 +1,95 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Public libraries
+import numpy as np
+import random
+
+
+# Legal actions are passed as bit masks: bit j set if action j is available
+N_ACTIONS = 4
+N_MASKS = 2 ** N_ACTIONS
+ACTION_BITS = 1 << np.arange(N_ACTIONS)
+
+# Per tie mask: number of tied actions and the k-th tied action
+TIE_COUNT = np.array([bin(m).count("1") for m in range(N_MASKS)], dtype=np.int64)
+TIE_SELECT = np.array([[[j for j in range(N_ACTIONS) if m >> j & 1][k] if k < TIE_COUNT[m] else -1
+                        for k in range(N_ACTIONS)] for m in range(N_MASKS)], dtype=np.int64)
+TIE_ACTIONS = [tuple(j for j in range(N_ACTIONS) if m >> j & 1) for m in range(N_MASKS)]
+
+
+# 2. Policy
+# -------------------------------------------------------------------------
+
+class Policy(object):
+    """
+    Greedy policy compiled from a Q-table for serving. For every state and legal-action mask it stores
+    the set of best actions as bit mask, so a move is one array lookup plus a random pick among ties.
+    Only depends on NumPy; state indices and legal masks come from sar.MOVE_STATE / sar.MOVE_PLAY.
+    """
+
+    def __init__(self, ties, seed=None):
+        """
+        Required parameters: ties as uint8 array of shape (n_states, 16)
+        Optional parameters: seed for the tie-breaking random generator
+        """
+
+        self.ties = ties
+        self.rows = ties.tolist()
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def compile(cls, q, seed=None):
+        """
+        Compiles Q-values of shape (n_states, 4) into the best-action sets of all legal-action masks.
+        Ties are exact equality of values, as in QTable.argmax.
+        """
+
+        q = np.asarray(q, dtype=np.float64)
+        ties = np.zeros((len(q), N_MASKS), dtype=np.uint8)
+
+        for mask in range(1, N_MASKS):
+            allowed = (mask & ACTION_BITS) != 0
+            vals = np.where(allowed, q, -np.inf)
+            best = vals == vals.max(axis=1, keepdims=True)
+            ties[:, mask] = (best & allowed) @ ACTION_BITS
+
+        return cls(ties, seed)
+
+    def act(self, s, mask):
+        """
+        Returns the action index for a state index and a legal-action mask, -1 if nothing is legal.
+        """
+
+        actions = TIE_ACTIONS[self.rows[s][mask]]
+
+        if len(actions) == 1:
+            return actions[0]
+        if len(actions) == 0:
+            return -1
+        return self.random.choice(actions)
+
+    def act_batch(self, s, masks):
+        """
+        Vectorized act for state indices and legal-action masks of shape (n,).
+        """
+
+        ties = self.ties[s, masks]
+        k = (self.rng.random(len(ties)) * TIE_COUNT[ties]).astype(np.int64)
+        return TIE_SELECT[ties, k]
+
+    def __call__(self, states, allowed):
+        """
+        Batched policy interface of batch.BatchGame: allowed as bool array of shape (n, 4).
+        """
+
+        return self.act_batch(states, allowed @ ACTION_BITS)
+
+    def save(self, path):
+        np.savez(path, ties=self.ties)
+
+    @classmethod
+    def load(cls, path, seed=None):
+        with np.load(path) as data:
+            return cls(data["ties"], seed)
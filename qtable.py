@@ -0,0 +1,614 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Public libraries
+import numpy as np
+import random
+import json
+import ast
+import os
+from multiprocessing.shared_memory import SharedMemory
+
+
+MODEL_FORMAT = 1
+
+
+# 2. Q-table
+# -------------------------------------------------------------------------
+
+class QTable(object):
+    """
+    Dense state-action table backed by a float64 NumPy matrix.
+    Rows and columns are addressed by integer indices, so reads, writes and the greedy argmax are O(1).
+    The state space and action labels are only kept to translate the tuples of Player.identify_state
+    and to build a DataFrame view on demand.
+    The number of nonzero entries (overall and per action) is kept up to date by every write method,
+    so coverage can be read in O(1). Tables built from data are only counted on the first read of coverage,
+    so loading (or memory-mapping) a table and building the reward table stay free.
+    Code writing to values directly has to call recount() afterwards.
+    """
+
+    def __init__(self, space, actions, data=None):
+        """
+        Required parameters:
+            - space as StateSpace
+            - actions as list of str
+        Optional parameters:
+            - data as array of shape (len(space), len(actions)), zeros if omitted
+        """
+
+        self.space = space
+        self.states = space.states
+        self.actions = actions
+        self.action_index = {a: j for j, a in enumerate(actions)}
+
+        if data is None:
+            self.values = np.zeros((len(space), len(actions)), dtype=np.float64)
+            self.filled_actions = np.zeros(len(actions), dtype=np.int64)
+            self.filled = 0
+        else:
+            self.values = np.asarray(data, dtype=np.float64)
+            self.filled_actions = None
+
+    @classmethod
+    def from_frame(cls, frame, space, actions):
+        """
+        Builds a table from a DataFrame indexed by state tuples, aligned to the given labels.
+        States missing from the frame are initialized at zero.
+        """
+
+        frame = frame.reindex(index=space.states, columns=actions).fillna(0)
+        return cls(space, actions, frame.values)
+
+    def recount(self):
+        """
+        Recounts the nonzero entries after values were written directly.
+        filled_actions is None while the table is not counted yet.
+        """
+
+        self.filled_actions = np.count_nonzero(self.values, axis=0)
+        self.filled = int(self.filled_actions.sum())
+
+    def assign(self, values):
+        """
+        Overwrites all values in place.
+        """
+
+        self.values[:] = values
+        self.filled_actions = None
+
+    @property
+    def coverage(self):
+        """
+        Number of nonzero entries.
+        """
+
+        if self.filled_actions is None:
+            self.recount()
+        return self.filled
+
+    @property
+    def coverage_ratio(self):
+        return self.coverage / self.values.size
+
+    @property
+    def per_action(self):
+        """
+        Number of nonzero entries per action.
+        """
+
+        if self.filled_actions is None:
+            self.recount()
+        return dict(zip(self.actions, self.filled_actions.tolist()))
+
+    def copy(self):
+        return QTable(self.space, self.actions, self.values.copy())
+
+    def to_frame(self):
+        """
+        Returns a DataFrame view of the table for analysis, indexed by state tuples.
+        """
+
+        import pandas as pd
+        return pd.DataFrame(data=self.values, columns=self.actions, index=self.states)
+
+    # (1) Label translation
+    def state_idx(self, state):
+        return self.space.state_index[state]
+
+    def action_idx(self, action):
+        return self.action_index[action]
+
+    # (2) Element access
+    def get(self, s, a):
+        return self.values[s, a]
+
+    def set(self, s, a, val):
+        values = self.values
+        old = values[s, a]
+        values[s, a] = val
+
+        if (not old) != (not val) and self.filled_actions is not None:
+            change = 1 if not old else -1
+            self.filled += change
+            self.filled_actions[a] += change
+
+    def add(self, s, a, val):
+        values = self.values
+        old = values[s, a]
+        new = values[s, a] = old + val
+
+        if (not old) != (not new) and self.filled_actions is not None:
+            change = 1 if not old else -1
+            self.filled += change
+            self.filled_actions[a] += change
+
+    def add_at(self, s, a, vals):
+        """
+        Vectorized add for index arrays s and a, repeated (s, a) pairs accumulate.
+        Only cells that turn zero or nonzero are deduplicated for the counters.
+        """
+
+        s, a = np.asarray(s), np.asarray(a)
+        before = self.values[s, a] != 0
+
+        np.add.at(self.values, (s, a), vals)
+
+        if self.filled_actions is None:
+            return
+
+        change = (self.values[s, a] != 0) != before
+        if change.any():
+            cells, first = np.unique((s * len(self.actions) + a)[change], return_index=True)
+            delta = np.where(before[change][first], -1, 1)
+            np.add.at(self.filled_actions, cells % len(self.actions), delta)
+            self.filled += int(delta.sum())
+
+    def lookup(self, s, a):
+        """
+        Vectorized get for index arrays s and a.
+        """
+
+        return self.values[s, a]
+
+    def rows(self, s):
+        """
+        Rows of values of several states as lists, in one lookup.
+        """
+
+        return self.values[s].tolist()
+
+    def add_mean(self, s, a, vals):
+        """
+        Vectorized add for index arrays s and a, a pair occurring k times gets the mean of its k values.
+        Used for batched updates that all start from the values before the batch, so a batch never
+        moves a value further than a single update would.
+        """
+
+        pair = np.asarray(s) * len(self.actions) + np.asarray(a)
+        _, inverse, counts = np.unique(pair, return_inverse=True, return_counts=True)
+        self.add_at(s, a, vals / counts[inverse])
+
+    def argmax(self, s, allowed, rng=random, row=None):
+        """
+        Returns the action index with the highest value among the allowed action indices.
+        Ties are broken uniformly at random by rng (random module or streams.RandomStream).
+        A row of values fetched beforehand (e.g. in a batch with other states) replaces the lookup of s.
+        """
+
+        vals = self.values[s, allowed] if row is None else [row[a] for a in allowed]
+        best = max(vals)
+        ties = [a for a, val in zip(allowed, vals) if val == best]
+
+        if len(ties) == 1:
+            return ties[0]
+        return rng.choice(ties)
+
+    def argmax_batch(self, s, allowed, rng):
+        """
+        Vectorized argmax for many states at once, ties are broken uniformly at random.
+        Required parameters:
+            - s as int array of shape (n,)
+            - allowed as bool array of shape (n, len(actions))
+            - rng as numpy Generator
+        """
+
+        vals = np.where(allowed, self.values[s], -np.inf)
+        ties = vals == vals.max(axis=1, keepdims=True)
+        return np.argmax(ties * rng.random(ties.shape), axis=1)
+
+
+def merge_tables(q, visit, shards):
+    """
+    Merges tables trained in parallel from the same starting point back into q and visit (in place).
+    Q-values are averaged weighted by the visits each shard gained since the starting point, so a cell
+    updated by a single shard takes that shard's value; cells no shard visited keep their value.
+    The gained visits are summed up.
+    Required parameters:
+        - q as QTable, the common starting point
+        - visit as QTable, the common starting point
+        - shards as list of (q_values, visit_values) arrays
+    """
+
+    qs = np.stack([shard[0] for shard in shards])
+    gained = np.stack([shard[1] for shard in shards]) - visit.values
+    weight = gained.sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weighted = (qs * gained).sum(axis=0) / weight
+
+    q.assign(np.where(weight > 0, weighted, q.values))
+    visit.assign(visit.values + weight)
+
+
+# 3. Persistence
+# -------------------------------------------------------------------------
+
+def model_files(path):
+    """
+    Returns the header, Q-table and visits file names of a model stored under the path prefix.
+    """
+
+    return path + ".json", path + "-q.npy", path + "-visits.npy"
+
+
+def save_model(path, q, visit):
+    """
+    Stores the Q-table and visits table as raw .npy arrays plus a JSON header with the state-space layout.
+    Required parameters:
+        - path as str, file prefix without extension
+        - q as QTable
+        - visit as QTable
+    """
+
+    file_header, file_q, file_visit = model_files(path)
+    folder = os.path.dirname(file_header)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    header = {"format": MODEL_FORMAT,
+              "layout": q.space.layout(),
+              "actions": list(q.actions)}
+
+    np.save(file_q, np.ascontiguousarray(q.values))
+    np.save(file_visit, np.ascontiguousarray(visit.values))
+    with open(file_header, "w") as f:
+        json.dump(header, f)
+
+
+def load_model(path, space, actions, mmap_mode=None):
+    """
+    Loads the Q-table and visits table stored under the path prefix.
+    With mmap_mode ("r", "r+" or "c", see numpy.load) the arrays are memory-mapped instead of read.
+    Raises ValueError if the model was stored with a different state encoding or action set.
+    """
+
+    file_header, file_q, file_visit = model_files(path)
+
+    with open(file_header) as f:
+        header = json.load(f)
+
+    if header.get("format") != MODEL_FORMAT:
+        raise ValueError(f'Model {path} has format {header.get("format")}, expected {MODEL_FORMAT}')
+    if header.get("layout") != space.layout() or header.get("actions") != list(actions):
+        raise ValueError(f'Model {path} was stored with a different state encoding')
+
+    q = QTable(space, actions, np.load(file_q, mmap_mode=mmap_mode))
+    visit = QTable(space, actions, np.load(file_visit, mmap_mode=mmap_mode))
+
+    shape = (len(space), len(actions))
+    if q.values.shape != shape or visit.values.shape != shape:
+        raise ValueError(f'Model {path} does not match the state space shape {shape}')
+
+    return q, visit
+
+
+def read_csv_table(file, space, actions):
+    """
+    Reads a table exported by earlier versions as CSV, so it can be converted with save_model.
+    The tuple labels are parsed as literals, never evaluated.
+    """
+
+    import pandas as pd
+
+    frame = pd.read_csv(file, sep=";", index_col=0)
+    frame.index = frame.index.map(ast.literal_eval)
+    return QTable.from_frame(frame, space, actions)
+
+
+def convert_csv_model(path, space, actions):
+    """
+    Converts the CSV Q-table and visits table stored by earlier versions under the path prefix
+    (path-q.csv, path-visits.csv) to the binary format of save_model, next to them.
+    """
+
+    q = read_csv_table(path + "-q.csv", space, actions)
+    visit = read_csv_table(path + "-visits.csv", space, actions)
+    save_model(path, q, visit)
+
+
+# 4. Shared memory
+# -------------------------------------------------------------------------
+
+class StripedQTable(QTable):
+    """
+    QTable whose add and add_at hold the lock of the row's stripe (s % len(locks)) for the read-modify-write,
+    so concurrent counters (visits) are not lost. add_at takes the stripes in ascending order.
+    """
+
+    def __init__(self, space, actions, data, locks):
+        QTable.__init__(self, space, actions, data)
+        self.locks = locks
+
+    def add(self, s, a, val):
+        with self.locks[s % len(self.locks)]:
+            QTable.add(self, s, a, val)
+
+    def add_at(self, s, a, vals):
+        stripes = np.unique(np.asarray(s) % len(self.locks)).tolist()
+        for stripe in stripes:
+            self.locks[stripe].acquire()
+        try:
+            QTable.add_at(self, s, a, vals)
+        finally:
+            for stripe in reversed(stripes):
+                self.locks[stripe].release()
+
+
+class SharedTables(object):
+    """
+    Q-table and visits table in one multiprocessing.shared_memory block, so learner processes update the
+    same arrays directly (Hogwild: Q-value writes take no lock, a lost update only costs one step).
+    The creating process owns the block and unlinks it; other processes attach by name.
+    The coverage counters of each QTable only see the writes of their own process, call recount() to read them.
+    """
+
+    def __init__(self, space, actions, name=None, data=None, locks=None):
+        """
+        Required parameters:
+            - space as StateSpace
+            - actions as list of str
+        Optional parameters:
+            - name as str, attach to the existing block of that name instead of creating one
+            - data as (q_values, visit_values), initial values of a created block
+            - locks as list of multiprocessing locks, striped locks for the visit counters
+        """
+
+        shape = (2, len(space), len(actions))
+        self.owner = name is None
+        self.shm = SharedMemory(create=True, size=int(np.prod(shape)) * 8) if self.owner else SharedMemory(name=name)
+
+        arrays = np.ndarray(shape, dtype=np.float64, buffer=self.shm.buf)
+        if self.owner:
+            arrays[:] = 0 if data is None else data
+
+        self.q = QTable(space, actions, arrays[0])
+        if locks:
+            self.visit = StripedQTable(space, actions, arrays[1], locks)
+        else:
+            self.visit = QTable(space, actions, arrays[1])
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        """
+        Detaches this process; the tables are unusable afterwards. The owner also frees the block.
+        """
+
+        self.q.values = self.visit.values = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# 5. Sparse table
+# -------------------------------------------------------------------------
+
+# Fibonacci hashing: the key times 2^64 / golden ratio, the top bits select the slot
+HASH_MULT = 0x9E3779B97F4A7C15
+HASH_MASK = 0xFFFFFFFFFFFFFFFF
+
+
+class SparseQTable(QTable):
+    """
+    State-action table for state keys of a large, sparsely visited space (int64 keys of an encoder, see
+    encoders.RichEncoder). Keys are open-addressed (linear probing) into a hash index, which points to rows
+    of growable key and value arrays in insertion order. Memory scales with the states actually written,
+    reads of unknown states return zeros without inserting them; lookups are O(1) on average.
+    The element, vectorized and argmax methods of QTable take state keys instead of dense indices;
+    the coverage counters work as in QTable. Row numbers are internal and change between tables.
+    """
+
+    def __init__(self, actions, capacity=1024):
+        """
+        Required parameters: actions as list of str
+        Optional parameters: capacity as int, initial number of rows (a power of two)
+        """
+
+        self.space = None
+        self.actions = actions
+        self.action_index = {a: j for j, a in enumerate(actions)}
+        self.size = 0
+
+        self.keys = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros((capacity, len(actions)), dtype=np.float64)
+        self.filled_actions = np.zeros(len(actions), dtype=np.int64)
+        self.filled = 0
+        self.rehash(2 * capacity)
+
+    def __len__(self):
+        return self.size
+
+    def rehash(self, slots):
+        """
+        Rebuilds the hash index with the given number of slots (a power of two).
+        """
+
+        self.shift = 64 - (slots.bit_length() - 1)
+        self.slot_mask = slots - 1
+        self.index = np.full(slots, -1, dtype=np.int64)
+
+        for row, key in enumerate(self.keys[:self.size].tolist()):
+            pos = ((key * HASH_MULT) & HASH_MASK) >> self.shift
+            while self.index[pos] >= 0:
+                pos = (pos + 1) & self.slot_mask
+            self.index[pos] = row
+
+    def row(self, key, insert=False):
+        """
+        Returns the row of a state key, -1 if it is unknown. With insert=True unknown keys get a new zero row.
+        """
+
+        key = int(key)
+        index, keys = self.index, self.keys
+        pos = ((key * HASH_MULT) & HASH_MASK) >> self.shift
+
+        while True:
+            row = index[pos]
+            if row < 0:
+                return self.insert(key, pos) if insert else -1
+            if keys[row] == key:
+                return int(row)
+            pos = (pos + 1) & self.slot_mask
+
+    def insert(self, key, pos):
+        row = self.size
+        if row == len(self.keys):
+            self.keys = np.concatenate([self.keys, np.zeros_like(self.keys)])
+            self.values = np.concatenate([self.values, np.zeros_like(self.values)])
+
+        self.keys[row] = key
+        self.index[pos] = row
+        self.size += 1
+
+        # Keep the load factor at or below 1/2
+        if 2 * self.size > len(self.index):
+            self.rehash(2 * len(self.index))
+
+        return row
+
+    def find(self, s, insert=False):
+        """
+        Vectorized row for an array of state keys: all keys probe together, one slot per round.
+        """
+
+        s = np.asarray(s, dtype=np.int64)
+        if insert:
+            missing = self.find(s) < 0
+            for key in np.unique(s[missing]).tolist():
+                self.row(key, insert=True)
+
+        rows = np.full(len(s), -1, dtype=np.int64)
+        pos = ((s.astype(np.uint64) * np.uint64(HASH_MULT)) >> np.uint64(self.shift)).astype(np.int64)
+        pending = np.arange(len(s))
+
+        while len(pending):
+            candidate = self.index[pos[pending]]
+            found = candidate >= 0
+            found[found] = self.keys[candidate[found]] == s[pending[found]]
+            rows[pending[found]] = candidate[found]
+
+            pending = pending[(candidate >= 0) & ~found]
+            pos[pending] = (pos[pending] + 1) & self.slot_mask
+
+        return rows
+
+    def copy(self):
+        table = SparseQTable.__new__(SparseQTable)
+        table.__dict__.update(self.__dict__)
+        table.keys, table.values, table.index = self.keys.copy(), self.values.copy(), self.index.copy()
+        table.filled_actions = None if self.filled_actions is None else self.filled_actions.copy()
+        return table
+
+    def to_frame(self):
+        """
+        Returns a DataFrame view of the written rows, indexed by state key.
+        """
+
+        import pandas as pd
+        return pd.DataFrame(data=self.values[:self.size], columns=self.actions, index=self.keys[:self.size])
+
+    def state_idx(self, state):
+        raise TypeError("A SparseQTable is addressed by state keys, not state tuples")
+
+    # Element access by state key
+    def get(self, s, a):
+        row = self.row(s)
+        return self.values[row, a] if row >= 0 else 0.0
+
+    def set(self, s, a, val):
+        QTable.set(self, self.row(s, insert=True), a, val)
+
+    def add(self, s, a, val):
+        row = self.row(s, insert=True)
+        QTable.set(self, row, a, self.values[row, a] + val)
+
+    def add_at(self, s, a, vals):
+        QTable.add_at(self, self.find(s, insert=True), a, vals)
+
+    def lookup(self, s, a):
+        rows = self.find(s)
+        return np.where(rows >= 0, self.values[rows, a], 0.0)
+
+    def rows(self, s):
+        zeros = [0.0] * len(self.actions)
+        return [self.values[row].tolist() if row >= 0 else zeros for row in self.find(s).tolist()]
+
+    def argmax(self, s, allowed, rng=random, row=None):
+        if row is None:
+            r = self.row(s)
+            row = self.values[r].tolist() if r >= 0 else [0.0] * len(self.actions)
+        return QTable.argmax(self, s, allowed, rng, row)
+
+    def argmax_batch(self, s, allowed, rng):
+        raise TypeError("The batch engine plays on dense state indices, use a QTable")
+
+
+def save_sparse_model(path, q, visit, layout):
+    """
+    Stores a SparseQTable pair as one .npz with the written keys and rows of both tables, plus the JSON header.
+    Required parameters:
+        - path as str, file prefix without extension
+        - q, visit as SparseQTable
+        - layout as dict, the encoder layout
+    """
+
+    file_header = path + ".json"
+    folder = os.path.dirname(file_header)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    np.savez(path + "-sparse.npz",
+             q_keys=q.keys[:q.size], q_values=q.values[:q.size],
+             visit_keys=visit.keys[:visit.size], visit_values=visit.values[:visit.size])
+    with open(file_header, "w") as f:
+        json.dump({"format": MODEL_FORMAT, "layout": layout, "actions": list(q.actions)}, f)
+
+
+def load_sparse_model(path, layout, actions):
+    """
+    Loads the SparseQTable pair stored by save_sparse_model.
+    Raises ValueError if the model was stored with a different state encoding or action set.
+    """
+
+    with open(path + ".json") as f:
+        header = json.load(f)
+
+    if header.get("format") != MODEL_FORMAT:
+        raise ValueError(f'Model {path} has format {header.get("format")}, expected {MODEL_FORMAT}')
+    if header.get("layout") != layout or header.get("actions") != list(actions):
+        raise ValueError(f'Model {path} was stored with a different state encoding')
+
+    tables = list()
+    with np.load(path + "-sparse.npz") as data:
+        for name in ("q", "visit"):
+            keys, values = data[name + "_keys"], data[name + "_values"]
+            table = SparseQTable(actions, capacity=max(1024, 1 << int(len(keys)).bit_length()))
+            rows = table.find(keys, insert=True)
+            table.values[rows] = values
+            table.recount()
+            tables.append(table)
+
+    return tables[0], tables[1]
@@ -0,0 +1,144 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Public libraries
+import numpy as np
+import glob
+import math
+import os
+
+
+# Columns of a game record and their storage types
+FIELDS = {"winner": np.int8,
+          "turns": np.int16,
+          "points": np.int32,
+          "coverage": np.int64,
+          "elapsed": np.float64}
+
+SEATS = 4
+
+
+def game_record(game, coverage, elapsed):
+    """
+    Compact record of a finished Game: winner seat, number of rounds, final points per seat,
+    Q-table coverage and elapsed seconds.
+    """
+
+    players = [game.player_1, game.player_2, game.player_3, game.player_4]
+    return {"winner": game.winner.order,
+            "turns": game.turn_no,
+            "points": [player.points for player in players],
+            "coverage": coverage,
+            "elapsed": elapsed}
+
+
+# 2. Streaming statistics
+# -------------------------------------------------------------------------
+
+class RunningStats(object):
+    """
+    Mean and variance of a stream of values (Welford), in constant memory.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class Summary(object):
+    """
+    Running aggregates over game records: wins per seat, turns, points per seat and game duration.
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.wins = [0] * SEATS
+        self.turns = RunningStats()
+        self.points = [RunningStats() for seat in range(SEATS)]
+        self.elapsed = RunningStats()
+
+    def update(self, record):
+        self.games += 1
+        self.wins[record["winner"]] += 1
+        self.turns.update(record["turns"])
+        for seat in range(SEATS):
+            self.points[seat].update(record["points"][seat])
+        self.elapsed.update(record["elapsed"])
+
+    def win_rate(self, seat=0):
+        return self.wins[seat] / self.games if self.games else 0.0
+
+    def report(self):
+        return {"games": self.games,
+                "win_rate": [self.win_rate(seat) for seat in range(SEATS)],
+                "turns_mean": self.turns.mean,
+                "turns_std": self.turns.std,
+                "points_mean": [stats.mean for stats in self.points],
+                "elapsed_mean": self.elapsed.mean}
+
+
+# 3. Columnar sink
+# -------------------------------------------------------------------------
+
+class ColumnarSink(object):
+    """
+    Collects game records in preallocated column arrays and appends them as numbered .npz chunks
+    to a folder, keeping a Summary of everything written. Memory stays at one chunk.
+    """
+
+    def __init__(self, folder, chunk_size=10000):
+        self.folder = folder
+        self.chunk_size = chunk_size
+        self.summary = Summary()
+        self.size = 0
+        self.chunks = len(glob.glob(os.path.join(folder, "chunk-*.npz")))
+        self.columns = {name: np.zeros((chunk_size, SEATS) if name == "points" else chunk_size, dtype=dtype)
+                        for name, dtype in FIELDS.items()}
+
+        os.makedirs(folder, exist_ok=True)
+
+    def write(self, record):
+        for name in FIELDS:
+            self.columns[name][self.size] = record[name]
+        self.size += 1
+        self.summary.update(record)
+
+        if self.size == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.size == 0:
+            return
+
+        path = os.path.join(self.folder, f'chunk-{self.chunks:06d}.npz')
+        np.savez(path, **{name: column[:self.size] for name, column in self.columns.items()})
+        self.chunks += 1
+        self.size = 0
+
+    def close(self):
+        self.flush()
+
+
+def read_results(folder):
+    """
+    Loads all chunks of a ColumnarSink folder into one dict of column arrays.
+    """
+
+    chunks = [np.load(path) for path in sorted(glob.glob(os.path.join(folder, "chunk-*.npz")))]
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) if chunks else np.zeros(0, dtype=dtype)
+            for name, dtype in FIELDS.items()}
@@ -1,49 +1,222 @@
 # 1. Libraries
 # -------------------------------------------------------------------------
 
-import pandas as pd
 import numpy as np
-import itertools
+import functools
 
 
-# 2. Functions
+# 2. State space
 # -------------------------------------------------------------------------
 
-def states():
+SUITS = ["PIR", "ZOL", "TOK", "MAK"]
+
+# Card bit masks: card suit * 8 + value - 1 is the bit of a card, so every suit occupies one byte
+SUIT_MASKS = [0xFF << (8 * suit) for suit in range(len(SUITS))]
+POPCOUNT = [bin(b).count("1") for b in range(256)]
+
+# Bumped whenever the state encoding changes, so stored models of an older encoding are rejected
+ENCODING_VERSION = 1
+
+# Valid (hand count, playable count) pairs of a suit: hand counts are clipped at 2, playable counts at 1
+# and a suit can only be playable if it is held
+PAIRS = [(0, 0), (1, 0), (1, 1), (2, 0), (2, 1)]
+
+
+class StateSpace(object):
+    """
+    Enumeration of all states with closed-form ranking.
+    A state consists of the open suit and a (hand, playable) pair per suit, so its dense index is the
+    mixed-radix number open * 5^4 + rank(pair_PIR) * 5^3 + ... + rank(pair_MAK) in base len(PAIRS).
+    The enumeration is built once per process by state_space().
+    """
+
+    def __init__(self):
+        self.suits = SUITS
+        self.suit_rank = {suit: i for i, suit in enumerate(SUITS)}
+        self.radix = len(PAIRS)
+        self.size = len(SUITS) * self.radix ** len(SUITS)
+
+        # Pair rank lookup [hand][playable], -1 for impossible combinations
+        self.pair_rank = [[-1, -1], [-1, -1], [-1, -1]]
+        for i, (h, p) in enumerate(PAIRS):
+            self.pair_rank[h][p] = i
+
+        self.pair_rank_array = np.array(self.pair_rank)
+        self.weights = self.radix ** np.arange(len(SUITS) - 1, -1, -1)
+
+        # (1) Decode all indices at once into the columns OPEN, PIR, ZOL, TOK, MAK, PIR#, ZOL#, TOK#, MAK#
+        index = np.arange(self.size)
+        digits = np.empty((self.size, len(SUITS)), dtype=np.int64)
+        rest = index
+        for i in reversed(range(len(SUITS))):
+            rest, digits[:, i] = np.divmod(rest, self.radix)
+
+        pairs = np.array(PAIRS)
+        self.table = np.concatenate([rest[:, None], pairs[digits, 0], pairs[digits, 1]], axis=1)
+
+        # (2) Label tuples as returned by Player.identify_state
+        self.states = [(SUITS[row[0]],) + tuple(int(v) for v in row[1:]) for row in self.table.tolist()]
+        self.state_index = {state: i for i, state in enumerate(self.states)}
+
+    def __len__(self):
+        return self.size
+
+    def layout(self):
+        """
+        Returns a JSON-serializable description of the encoding, stored alongside saved models.
+        """
+
+        return {"encoding": ENCODING_VERSION,
+                "suits": list(self.suits),
+                "pairs": [list(pair) for pair in PAIRS],
+                "size": self.size}
+
+    def encode(self, state_dict):
+        """
+        Returns the dense index of a state dictionary as built by Player.identify_state.
+        """
+
+        idx = self.suit_rank[state_dict["OPEN"]]
+        for suit in SUITS:
+            idx = idx * self.radix + self.pair_rank[state_dict[suit]][state_dict[suit + "#"]]
+
+        return idx
+
+    def encode_tuple(self, state):
+        """
+        Returns the dense index of a state tuple (OPEN, PIR, ZOL, TOK, MAK, PIR#, ZOL#, TOK#, MAK#).
+        """
+
+        idx = self.suit_rank[state[0]]
+        for i in range(len(SUITS)):
+            idx = idx * self.radix + self.pair_rank[state[1 + i]][state[5 + i]]
+
+        return idx
+
+    def encode_counts(self, open_suit, hand, play):
+        """
+        Vectorized encode of many states at once.
+        Required parameters:
+            - open_suit as int array of shape (n,), suit ranks
+            - hand as int array of shape (n, 4), hand cards per suit
+            - play as int array of shape (n, 4), playable cards per suit
+        """
+
+        ranks = self.pair_rank_array[np.minimum(hand, 2), np.minimum(play, 1)]
+        return open_suit * self.radix ** len(SUITS) + ranks @ self.weights
+
+    def decode(self, idx):
+        """
+        Returns the state tuple of a dense index.
+        """
+
+        return self.states[idx]
+
+    def rewards(self, n_actions):
+        """
+        Reward matrix of shape (size, n_actions): 1 for states without hand cards, otherwise 0.
+        """
+
+        empty = self.table[:, 1:5].sum(axis=1) == 0
+        return np.repeat(empty[:, None], n_actions, axis=1).astype(np.float64)
+
+
+@functools.lru_cache(maxsize=None)
+def state_space():
+    """
+    Returns the StateSpace of this process, building it on first use.
+    Building takes a few milliseconds (~4-8 ms), paid once per process, so it is only cached in memory;
+    an on-disk cache would save little and would have to be invalidated with the encoding.
+    """
+
+    return StateSpace()
+
+
+@functools.lru_cache(maxsize=None)
+def reward_table(n_actions):
+    """
+    Returns the read-only reward matrix of this process' StateSpace, shared by all agents.
+    """
+
+    table = state_space().rewards(n_actions)
+    table.setflags(write=False)
+    return table
+
+
+# 3. Move tables
+# -------------------------------------------------------------------------
+
+# A hand enters the tables only through its per-suit counts clipped at 2 (enough for both the state
+# and the playable suits), the open suit enters as suit rank + 1 with 0 for no open card:
+#     key = (open + 1) * 3^4 + clip(PIR) * 3^3 + clip(ZOL) * 3^2 + clip(TOK) * 3 + clip(MAK)
+CLIPPED = [min(count, 2) for count in POPCOUNT]
+MOVE_KEYS = (len(SUITS) + 1) * 3 ** len(SUITS)
+
+# Card mask of a 4-bit suit mask
+SUIT_SET_MASKS = [sum(SUIT_MASKS[suit] for suit in range(len(SUITS)) if suits >> suit & 1)
+                  for suits in range(2 ** len(SUITS))]
+
+
+def move_key(mask, open_suit):
+    """
+    Returns the move table key of a hand mask and the open suit rank (-1 if no card is open).
+    """
+
+    return ((((open_suit + 1) * 3 + CLIPPED[mask & 0xFF]) * 3 + CLIPPED[mask >> 8 & 0xFF]) * 3
+            + CLIPPED[mask >> 16 & 0xFF]) * 3 + CLIPPED[mask >> 24 & 0xFF]
+
+
+def move_tables():
     """
-    Help text
+    Builds the move tables indexed by move_key:
+        - playable suits as 4-bit mask (equal to the mask of available actions)
+        - dense state index, -1 if no card is open
+        - available action indices as tuple
     """
 
-    # Normal cards
-    norm_cards = {"PIR": 2, "ZOL": 2, "TOK": 2, "MAK": 2}
+    space = state_space()
+    play_suits, state_idx, actions_idx = list(), list(), list()
 
-    # Special cards
-    norm_cards_play = {"PIR#": 1, "ZOL#": 1, "TOK#": 1, "MAK#": 1}
+    for key in range(MOVE_KEYS):
+        rest, counts = key, list()
+        for suit in range(len(SUITS)):
+            rest, count = divmod(rest, 3)
+            counts.insert(0, count)
+        open_suit = rest - 1
 
-    # Combine dictionaries
-    states_dict = {**norm_cards, **norm_cards_play}
-    states = [["PIR", "ZOL", "TOK", "MAK"]]
+        # Only the open suit is playable if held, otherwise every held suit
+        held = [suit for suit in range(len(SUITS)) if counts[suit] > 0]
+        playable = [open_suit] if open_suit in held else held
 
-    for val in states_dict.values():
-        aux = range(0, val + 1)
-        states.append(aux)
+        play_suits.append(sum(1 << suit for suit in playable))
+        actions_idx.append(tuple(playable))
 
-    # Conduct all combinations
-    states = list(itertools.product(*states))
-    states_all = list()
+        if open_suit < 0:
+            state_idx.append(-1)
+        else:
+            state = (SUITS[open_suit],) + tuple(counts) + tuple(1 if suit in playable else 0 for suit in range(len(SUITS)))
+            state_idx.append(space.encode_tuple(state))
 
+    return play_suits, state_idx, actions_idx
 
-    for i in range(len(states)):
-        if (states[i][1] >= states[i][5]) and (states[i][2] >= states[i][6]) and (states[i][3] >= states[i][7]) and (
-                states[i][4] >= states[i][8]):
-            states_all.append(states[i])
 
-    return states_all
+MOVE_PLAY, MOVE_STATE, MOVE_ACTIONS = move_tables()
+
+
+# 4. Functions
+# -------------------------------------------------------------------------
+
+def states():
+    """
+    Returns all state tuples in dense index order.
+    """
+
+    return state_space().states
 
 
 def actions():
     """
-    Help text
+    Returns all actions, one per suit.
     """
 
     actions_all = ["PIR", "ZOL", "TOK", "MAK"]
@@ -52,18 +225,21 @@ def actions():
 
 def rewards(states, actions):
     """
-    Help text
+    Returns the reward table of the given states and actions as DataFrame.
     """
 
-    R = np.zeros((len(states), len(actions)))
-    states_t = [min(sum(states[i][1:5]), 1) for i in range(len(states))]
+    import pandas as pd
+
+    space = state_space()
 
-    for i in range(len(states)):
-        if states_t[i] == 0:
-            R[i] = 1
+    if states is space.states:
+        R = space.rewards(len(actions))
+    else:
+        empty = np.array([sum(state[1:5]) for state in states]) == 0
+        R = np.repeat(empty[:, None], len(actions), axis=1).astype(np.float64)
 
     R = pd.DataFrame(data=R,
                      columns=actions,
                      index=states)
 
-    return R
\ No newline at end of file
+    return R
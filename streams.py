@@ -0,0 +1,58 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Public libraries
+import numpy as np
+
+
+# 2. Random streams
+# -------------------------------------------------------------------------
+
+class RandomStream(object):
+    """
+    Independent random stream on a NumPy Generator. Scalar uniforms are drawn in blocks, so a single draw
+    is a list pop instead of a Generator call. Provides the parts of the random module the game uses
+    (random, randrange, choice), so it can stand in wherever the random module was passed before.
+    """
+
+    def __init__(self, seed=None, block=256):
+        """
+        Optional parameters:
+            - seed as int or numpy SeedSequence
+            - block as int, number of uniforms drawn at once
+        """
+
+        self.generator = np.random.default_rng(seed)
+        self.block = block
+        self.buffer = list()
+
+    def random(self):
+        if not self.buffer:
+            self.buffer = self.generator.random(self.block).tolist()
+        return self.buffer.pop()
+
+    def randrange(self, n):
+        return int(self.random() * n)
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def permutation(self, n):
+        return self.generator.permutation(n).tolist()
+
+
+def seed_sequence(seed=None, spawned=0):
+    """
+    Root SeedSequence of a run. spawned skips the children already handed out, so a resumed run
+    continues with the same per-game streams as an uninterrupted one.
+    """
+
+    return np.random.SeedSequence(seed, n_children_spawned=spawned)
+
+
+def spawn_stream(seeds):
+    """
+    Spawns the next independent RandomStream (one per game or worker) from a SeedSequence.
+    """
+
+    return RandomStream(seeds.spawn(1)[0])
@@ -0,0 +1,119 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Custom libraries
+import alabujos as ala
+import evaluate as ev
+import state_action_reward as sar
+import streams
+from policy import Policy
+
+# Public libraries
+import numpy as np
+import itertools
+import multiprocessing
+import os
+import random
+
+
+# 2. Search spaces
+# -------------------------------------------------------------------------
+
+def grid(**params):
+    """
+    All combinations of the given parameter lists, e.g. grid(algo=["q-learning"], epsilon=[0.1, 0.2]).
+    """
+
+    names = list(params)
+    return [dict(zip(names, values)) for values in itertools.product(*params.values())]
+
+
+def random_search(n, seed=None, **params):
+    """
+    n random configurations: a list is sampled uniformly from its items, a (low, high) tuple uniformly
+    from the interval.
+    """
+
+    rng = random.Random(seed)
+    return [{name: rng.choice(space) if isinstance(space, list) else rng.uniform(*space)
+             for name, space in params.items()} for i in range(n)]
+
+
+# 3. Workers
+# -------------------------------------------------------------------------
+
+def worker_init():
+    """
+    Builds the state space and reward table of a worker process. With fork they are inherited
+    from the parent, which builds them before starting the pool, so this is a no-op.
+    """
+
+    sar.reward_table(len(sar.actions()))
+
+
+def train_evaluate(config, q, visit, games, seeds, eval_games):
+    """
+    Continues training of a configuration from the given Q and visit arrays for games more games,
+    then evaluates its greedy policy. Returns the win rate and the trained arrays.
+    """
+
+    agent_info = {key: val for key, val in config.items() if key != "algo"}
+    train_seeds, eval_seeds = seeds.spawn(2)
+
+    res = ala.tournament_worker(config["algo"], agent_info, q, visit, games, train_seeds)
+    q, visit = res[3], res[4]
+
+    eval_seed = int(eval_seeds.generate_state(1)[0])
+    policy = Policy.compile(q, eval_seed)
+    evaluation = ev.evaluate(policy, max_games=eval_games, width=0.0, points_width=0.0, p0=None, seed=eval_seed)
+
+    return evaluation["win_rate"], q, visit
+
+
+# 4. Successive halving
+# -------------------------------------------------------------------------
+
+def successive_halving(configs, min_games=100, max_games=2700, eta=3, eval_games=2000, workers=None, seed=None):
+    """
+    Trains all configurations (dicts with algo, epsilon, step_size and further agent_info entries) for
+    min_games games, evaluates them and keeps the best 1/eta by win rate; the survivors continue training
+    up to eta times the games, until max_games or a single configuration is left.
+    The configurations of a rung are trained in parallel in a pool of worker processes.
+    Returns the ranked results table as list of dicts: configurations that got further first,
+    then by win rate.
+    """
+
+    # Built once in the parent, forked workers share them
+    space = sar.state_space()
+    worker_init()
+
+    root = streams.seed_sequence(seed)
+    config_seeds = root.spawn(len(configs))
+    shape = (len(space), len(sar.actions()))
+
+    rows = [{**config, "games": 0, "rung": 0, "win_rate": None} for config in configs]
+    tables = [(np.zeros(shape), np.zeros(shape)) for config in configs]
+
+    alive = list(range(len(configs)))
+    budget = min(min_games, max_games)
+    rung = 0
+
+    with multiprocessing.Pool(workers or os.cpu_count(), initializer=worker_init) as pool:
+        while True:
+            tasks = [(configs[i], tables[i][0], tables[i][1], budget - rows[i]["games"],
+                      config_seeds[i].spawn(1)[0], eval_games) for i in alive]
+
+            for i, (win_rate, q, visit) in zip(alive, pool.starmap(train_evaluate, tasks)):
+                tables[i] = (q, visit)
+                rows[i].update(games=budget, rung=rung, win_rate=win_rate)
+
+            if budget >= max_games or len(alive) <= 1:
+                break
+
+            # Promote the best 1/eta to the next rung
+            alive.sort(key=lambda i: rows[i]["win_rate"], reverse=True)
+            alive = alive[:max(1, len(alive) // eta)]
+            budget = min(budget * eta, max_games)
+            rung += 1
+
+    return sorted(rows, key=lambda row: (row["rung"], row["win_rate"]), reverse=True)
@@ -0,0 +1,233 @@
+# 1. Libraries
+# -------------------------------------------------------------------------
+
+# Custom libraries
+import state_action_reward as sar
+
+# Public libraries
+import numpy as np
+import json
+import os
+
+
+TRACE_FORMAT = 1
+
+# One record per round: the deck in dealing order (players draw from its end), the 32 cards in play order
+# and the losing seat of each of the 8 tricks. Cards are stored as code = suit * 8 + value - 1.
+ROUND = np.dtype([("game", "<u4"),
+                  ("round", "<u2"),
+                  ("leader", "u1"),
+                  ("deal", "u1", (32,)),
+                  ("plays", "u1", (32,)),
+                  ("losers", "u1", (8,))])
+
+# One record per agent move, plus one terminal record per agent seat at the end of a game
+DECISION = np.dtype([("game", "<u4"),
+                     ("seat", "u1"),
+                     ("state", "<u2"),
+                     ("action", "u1"),
+                     ("terminal", "u1")])
+
+FILES = {"rounds": ROUND, "decisions": DECISION}
+
+
+def trace_files(folder):
+    """
+    Returns the header file and the record files of a trace folder.
+    """
+
+    return os.path.join(folder, "trace.json"), {name: os.path.join(folder, name + ".bin") for name in FILES}
+
+
+# 2. Recorder
+# -------------------------------------------------------------------------
+
+class TraceRecorder(object):
+    """
+    Appends compact binary records of the played games to the files of a trace folder (see ROUND and
+    DECISION). Records are collected in preallocated arrays and appended chunk-wise; an existing
+    trace is continued with the next game number.
+    """
+
+    def __init__(self, folder, chunk_size=4096):
+        """
+        Required parameters: folder as str
+        Optional parameters: chunk_size as int, records buffered per file
+        """
+
+        file_header, self.files = trace_files(folder)
+        os.makedirs(folder, exist_ok=True)
+
+        header = {"format": TRACE_FORMAT, "layout": sar.state_space().layout()}
+        if os.path.exists(file_header):
+            with open(file_header) as f:
+                if json.load(f) != header:
+                    raise ValueError(f'Trace {folder} was recorded with a different format or state encoding')
+        else:
+            with open(file_header, "w") as f:
+                json.dump(header, f)
+
+        self.chunk_size = chunk_size
+        self.buffers = {name: np.zeros(chunk_size, dtype=dtype) for name, dtype in FILES.items()}
+        self.sizes = {name: 0 for name in FILES}
+
+        rounds = read_records(self.files["rounds"], ROUND)
+        self.games = int(rounds["game"][-1]) + 1 if len(rounds) else 0
+        self.game = -1
+        self.round = -1
+        self.trick_no = 0
+
+    def next(self, name):
+        """
+        Returns the buffer index of a new record, appending the full buffer to its file first.
+        """
+
+        if self.sizes[name] == self.chunk_size:
+            self.flush(name)
+        i = self.sizes[name]
+        self.sizes[name] += 1
+        return i
+
+    def start_game(self):
+        self.game = self.games
+        self.games += 1
+        self.round_no = 0
+
+    def deal(self, leader, cards):
+        rounds = self.buffers["rounds"]
+        self.round = i = self.next("rounds")
+        rounds["game"][i] = self.game
+        rounds["round"][i] = self.round_no
+        rounds["leader"][i] = leader
+        rounds["deal"][i] = [card.code for card in cards]
+        self.round_no += 1
+        self.trick_no = 0
+
+    def trick(self, cards, loser):
+        rounds = self.buffers["rounds"]
+        t = self.trick_no
+        rounds["plays"][self.round, 4 * t:4 * t + 4] = [card.code for card in cards]
+        rounds["losers"][self.round, t] = loser
+        self.trick_no += 1
+
+    def decision(self, seat, s, a, terminal=False):
+        decisions = self.buffers["decisions"]
+        i = self.next("decisions")
+        decisions[i] = (self.game, seat, s, a, terminal)
+
+    def flush(self, name=None):
+        for name in ([name] if name else FILES):
+            if self.sizes[name]:
+                with open(self.files[name], "ab") as f:
+                    self.buffers[name][:self.sizes[name]].tofile(f)
+                self.sizes[name] = 0
+
+    def close(self):
+        self.flush()
+
+
+# 3. Offline learning
+# -------------------------------------------------------------------------
+
+def read_records(file, dtype):
+    """
+    Memory-maps a record file read-only, empty if it does not exist yet.
+    """
+
+    if not os.path.exists(file) or os.path.getsize(file) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(file, dtype=dtype, mode="r")
+
+
+def read_trace(folder):
+    """
+    Returns the memory-mapped round and decision records of a trace folder as dict.
+    """
+
+    file_header, files = trace_files(folder)
+    with open(file_header) as f:
+        header = json.load(f)
+
+    if header.get("format") != TRACE_FORMAT or header.get("layout") != sar.state_space().layout():
+        raise ValueError(f'Trace {folder} was recorded with a different format or state encoding')
+
+    return {name: read_records(files[name], dtype) for name, dtype in FILES.items()}
+
+
+def episodes(decisions, batch_games):
+    """
+    Yields the decision records of batch_games games at a time, grouped by (game, seat) in move order.
+    """
+
+    games = decisions["game"]
+    bounds = np.searchsorted(games, np.arange(int(games[0]), int(games[-1]) + batch_games + 1, batch_games)) \
+        if len(games) else np.zeros(1, dtype=np.int64)
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if start == end:
+            continue
+        chunk = np.asarray(decisions[start:end])
+        yield chunk[np.lexsort((chunk["seat"], chunk["game"]))]
+
+
+def learn(agent, folder, batch_games=1000):
+    """
+    Replays the agent seats' decisions of a trace through the update rule of the agent, in vectorized
+    batches of batch_games games: TD backups between consecutive moves of a seat for Q-learning,
+    (first-visit) returns of every seat's episode for Monte Carlo. Visits are counted like inline learning.
+    Q-learning applies the k-th transitions of all episodes of a batch together, in order of k, so the
+    transitions of an episode follow each other as inline; Monte Carlo moves every pair from its value
+    before the batch. Within one update, pairs shared by several episodes get the mean (see batch_update).
+    With a single agent seat and batch_games=1 this reproduces inline learning (without replay); larger
+    batches and several seats sharing a table are an approximation.
+    Returns the number of games replayed.
+    """
+
+    decisions = read_trace(folder)["decisions"]
+    n_actions = len(agent.actions)
+
+    for chunk in episodes(decisions, batch_games):
+        key = chunk["game"].astype(np.int64) * 4 + chunk["seat"]
+        states = chunk["state"].astype(np.int64)
+        actions = chunk["action"].astype(np.int64)
+        terminal = chunk["terminal"].astype(bool)
+
+        if not agent.episodic:
+            # (1) Q-learning: transitions between consecutive moves of the same seat in the same game
+            prev = np.flatnonzero((key[:-1] == key[1:]) & ~terminal[:-1] & ~terminal[1:])
+            s, a, next_s, next_a = states[prev], actions[prev], states[prev + 1], actions[prev + 1]
+            rewards = agent.R.lookup(next_s, next_a)
+
+            # Position of each transition within its episode
+            _, start, length = np.unique(key, return_index=True, return_counts=True)
+            position = (np.arange(len(chunk)) - np.repeat(start, length))[prev]
+
+            for k in range(int(position.max()) + 1 if len(prev) else 0):
+                wave = position == k
+                agent.batch_update(s[wave], a[wave], rewards[wave], next_s[wave], next_a[wave], rewards[wave] != 0)
+            agent.visit.add_at(s, a, 1)
+
+        else:
+            # (2) Monte Carlo: the reward of the terminal record is discounted back over the episode's moves
+            ends = np.flatnonzero(terminal)
+            reward = np.zeros(len(chunk))
+            reward[ends] = agent.R.lookup(states[ends], actions[ends])
+
+            moves = ~terminal
+            _, start, length = np.unique(key, return_index=True, return_counts=True)
+            episode = np.repeat(np.arange(len(start)), length)
+            step = np.arange(len(chunk)) - start[episode]
+
+            # The terminal record closes its episode, the moves before it are steps 0..T-1
+            steps = length - 1
+            returns = reward[(start + length - 1)[episode]] * agent.gamma ** (steps[episode] - 1 - step)
+
+            s, a, g, e = states[moves], actions[moves], returns[moves], key[moves]
+            if agent.first_visit:
+                _, first = np.unique((e * len(agent.space) + s) * n_actions + a, return_index=True)
+                agent.batch_update(s[first], a[first], g[first], e[first])
+            else:
+                agent.batch_update(s, a, g, e)
+            agent.visit.add_at(s, a, 1)
+
+    return int(decisions["game"][-1]) - int(decisions["game"][0]) + 1 if len(decisions) else 0